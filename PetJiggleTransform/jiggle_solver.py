@@ -0,0 +1,197 @@
+'''Maya free batch solver for the petJiggleTransform integration.
+
+Solves the goal trajectories of any number of jiggle points together, one vectorized step per
+substep, with the same stiffness, damping and substep integration as the node. This lets
+secondary motion be pre solved on machines without Maya.
+
+Goal trajectories are read from .npy files holding a (frames, points, 3) array, or from csv
+files with one row per frame and x, y, z columns for each point. The solved trajectories are
+written in the same layout.
+
+Long shots can be baked in parallel chunks. Each chunk is warmed up on the frames before it,
+so its start state is close to the one a serial pass would reach, and the chunks are stitched
+back together. The end state of every chunk can be written as a checkpoint that the node reads
+in checkpoint mode read, so a Maya render chunk starting mid shot continues the sim.
+
+usage:
+	python jiggle_solver.py goals.npy solved.npy --stiffness 0.3 --damping 0.1 --substeps 2
+	python jiggle_solver.py goals.npy solved.npy --chunk-size 200 --warmup 50 --processes 8
+'''
+import argparse
+import multiprocessing
+import os
+import sys
+import numpy as np
+
+# the integration and checkpoint names are shared with the plug-in
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'release'))
+from jiggle_core import jiggle_step, substep_rates, checkpoint_path
+
+
+def per_point(value):
+	'''Returns a float or per point values in a (n, 1) array that broadcasts against (n, 3).'''
+	value = np.asarray(value, dtype=np.float64)
+	if value.ndim == 0:
+		return float(value)
+	return value.reshape(-1, 1)
+
+
+def solve(goals, stiffness=1.0, damping=1.0, substeps=1, state=None):
+	'''Solves a (frames, n, 3) array of goals, one frame apart.
+
+	stiffness and damping are floats or (n,) arrays, given per frame like on the node.
+	state is a (curr_pos, prev_pos, prev_goal) tuple to continue from, without it the sim
+	starts at rest at the first goal.
+
+	Returns the (frames, n, 3) solved positions and the state after the last frame.
+	'''
+	goals = np.asarray(goals, dtype=np.float64)
+	solved = np.empty_like(goals)
+	if not len(goals):
+		return solved, state
+
+	if state is None:
+		curr_pos = goals[0].copy()
+		prev_pos = goals[0].copy()
+		prev_goal = goals[0]
+	else:
+		curr_pos, prev_pos, prev_goal = state
+
+	# per substep rates, see JiggleState.step in PetJiggleTransform.py
+	step_stiffness, step_damping = substep_rates(per_point(stiffness), per_point(damping), substeps)
+
+	for frame in range(len(goals)):
+		goal = goals[frame]
+		for i in range(substeps):
+			weight = (i + 1.0) / substeps
+			sub_goal = prev_goal + (goal - prev_goal) * weight
+			new_pos = jiggle_step(curr_pos, prev_pos, sub_goal, step_stiffness, step_damping)
+			prev_pos = curr_pos
+			curr_pos = new_pos
+
+		prev_goal = goal
+		solved[frame] = curr_pos
+
+	return solved, (curr_pos, prev_pos, prev_goal)
+
+
+def solve_chunk(args):
+	'''Solves a chunk of goals and returns the frames after the warmup, with the end state.'''
+	goals, stiffness, damping, substeps, warmup = args
+	solved, state = solve(goals, stiffness, damping, substeps)
+	return solved[warmup:], state
+
+
+def bake(goals, stiffness=1.0, damping=1.0, substeps=1, chunk_size=100, warmup=50, processes=None):
+	'''Solves a (frames, n, 3) array of goals in chunks across a process pool.
+
+	Every chunk but the first starts at rest warmup frames before its first frame and drops
+	those frames, so the result matches a serial solve once the jiggle from before the warmup
+	has damped out. Returns the solved positions and a list of (last frame, state) per chunk.
+	'''
+	goals = np.asarray(goals, dtype=np.float64)
+	chunks = []
+	ends = []
+	for start in range(0, len(goals), chunk_size):
+		end = min(start + chunk_size, len(goals))
+		warmup_start = max(start - warmup, 0)
+		# only the frames a chunk needs are sent to its worker
+		chunks.append((goals[warmup_start:end], stiffness, damping, substeps, start - warmup_start))
+		ends.append(end)
+
+	pool = multiprocessing.Pool(processes)
+	try:
+		results = pool.map(solve_chunk, chunks)
+	finally:
+		pool.close()
+		pool.join()
+
+	solved = np.concatenate([chunk_solved for chunk_solved, _ in results])
+	end_states = [(end - 1, state) for end, (_, state) in zip(ends, results)]
+	return solved, end_states
+
+
+def write_checkpoint(path, state, frame):
+	'''Writes a state to a compact binary .npz file, in the layout of JiggleState.write_checkpoint.'''
+	curr_pos, prev_pos, prev_goal = state
+	with open(path, 'wb') as f:
+		np.savez(f, curr_pos=curr_pos, prev_pos=prev_pos, prev_goal=prev_goal, time=frame, accumulator=0.0)
+
+
+def read_checkpoint(path):
+	'''Returns the state and frame of a checkpoint written by the node or write_checkpoint.'''
+	with np.load(path) as checkpoint:
+		state = (checkpoint['curr_pos'], checkpoint['prev_pos'], checkpoint['prev_goal'])
+		return state, float(checkpoint['time'])
+
+
+def load_trajectories(path):
+	'''Reads a (frames, points, 3) array from a .npy or csv file.'''
+	if path.endswith('.npy'):
+		trajectories = np.load(path)
+	else:
+		trajectories = np.loadtxt(path, delimiter=',', ndmin=2)
+
+	if trajectories.ndim == 2:
+		trajectories = trajectories.reshape(len(trajectories), -1, 3)
+	return trajectories
+
+
+def save_trajectories(path, trajectories):
+	'''Writes a (frames, points, 3) array to a .npy or csv file.'''
+	if path.endswith('.npy'):
+		np.save(path, trajectories)
+	else:
+		np.savetxt(path, trajectories.reshape(len(trajectories), -1), delimiter=',')
+
+
+def load_values(value):
+	'''A command line stiffness or damping, either a float or a .npy or csv file of per point values.'''
+	try:
+		return float(value)
+	except ValueError:
+		pass
+
+	if value.endswith('.npy'):
+		return np.load(value).ravel()
+	return np.loadtxt(value, delimiter=',', ndmin=1).ravel()
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Solve jiggle trajectories without Maya.')
+	parser.add_argument('goals', help='goal trajectories, .npy or csv')
+	parser.add_argument('output', help='where to write the solved trajectories, .npy or csv')
+	parser.add_argument('--stiffness', default='1.0', help='float, or a .npy or csv file with one value per point')
+	parser.add_argument('--damping', default='1.0', help='float, or a .npy or csv file with one value per point')
+	parser.add_argument('--substeps', type=int, default=1)
+	parser.add_argument('--chunk-size', type=int, default=0, help='frames per parallel chunk, 0 solves in one serial pass')
+	parser.add_argument('--warmup', type=int, default=50, help='frames each chunk is solved ahead of its first frame')
+	parser.add_argument('--processes', type=int, default=None, help='size of the process pool, defaults to the cpu count')
+	parser.add_argument('--checkpoint-dir', help='write the state at the end of every chunk here')
+	parser.add_argument('--name', default='jiggle', help='the checkpoint name, the jiggle node name for the node to read them')
+	parser.add_argument('--start-frame', type=float, default=1.0, help='the scene frame of the first goal')
+	args = parser.parse_args(argv)
+
+	goals = load_trajectories(args.goals)
+	stiffness = load_values(args.stiffness)
+	damping = load_values(args.damping)
+	substeps = max(args.substeps, 1)
+
+	if args.chunk_size > 0:
+		solved, end_states = bake(goals, stiffness, damping, substeps, args.chunk_size, args.warmup, args.processes)
+	else:
+		solved, state = solve(goals, stiffness, damping, substeps)
+		end_states = [(len(goals) - 1, state)]
+	save_trajectories(args.output, solved)
+
+	if args.checkpoint_dir:
+		for frame, state in end_states:
+			frame += args.start_frame
+			write_checkpoint(checkpoint_path(args.checkpoint_dir, args.name, frame), state, frame)
+
+	sys.stdout.write('solved %d points over %d frames\n' % (goals.shape[1], goals.shape[0]))
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
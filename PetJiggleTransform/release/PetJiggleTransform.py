@@ -1,70 +1,612 @@
 import maya.OpenMayaMPx as OpenMayaMPx
 import maya.OpenMaya as OpenMaya
 import math
+import os
+import bisect
+import collections
+import ctypes
+import sys
+import time
+import numpy as np
+
+# the maya free integration is shared with jiggle_solver.py, and lives next to this file
+plugin_dir = os.path.dirname(os.path.abspath(__file__))
+if plugin_dir not in sys.path:
+	sys.path.append(plugin_dir)
+from jiggle_core import jiggle_step, substep_rates, checkpoint_path
+
+
+# the most wall clock seconds an interactive evaluation steps, so the first evaluation after a
+# pause does not catch up on the whole pause
+max_interactive_elapsed = 0.1
+
+
+class CachedFrame(collections.namedtuple('CachedFrame', 'curr_pos prev_pos goal accumulator stiffness damping substeps')):
+	'''The state of a simulated frame together with the inputs it was simulated with.'''
+	__slots__ = ()
+
+	def matches(self, goal, stiffness, damping, substeps):
+		return (self.substeps == substeps and
+			np.array_equal(self.goal, goal) and
+			np.array_equal(self.stiffness, stiffness) and
+			np.array_equal(self.damping, damping))
+
+
+class FrameCache(object):
+	'''Frame keyed store of simulated states, bounded in size by evicting the least recently used frame.'''
+
+	def __init__(self):
+		# ordered from least to most recently used
+		self._entries = collections.OrderedDict()
+		# the cached frames in time order, used to find the frame to resume from
+		self._frames = []
+
+	def __len__(self):
+		return len(self._entries)
+
+	def get(self, frame):
+		entry = self._entries.pop(frame, None)
+		if entry is not None:
+			self._entries[frame] = entry
+		return entry
+
+	def add(self, frame, entry, size):
+		if self._entries.pop(frame, None) is None:
+			bisect.insort(self._frames, frame)
+		self._entries[frame] = entry
+
+		while len(self._entries) > size:
+			old_frame, _ = self._entries.popitem(last=False)
+			del self._frames[bisect.bisect_left(self._frames, old_frame)]
+
+	def nearest_before(self, frame):
+		'''Returns the latest cached frame before frame, or None.'''
+		i = bisect.bisect_left(self._frames, frame)
+		if i == 0:
+			return None
+		return self._frames[i - 1]
+
+	def invalidate_from(self, frame):
+		'''Drops frame and every frame after it, since they were simulated from stale inputs.'''
+		i = bisect.bisect_left(self._frames, frame)
+		for stale_frame in self._frames[i:]:
+			del self._entries[stale_frame]
+		del self._frames[i:]
+
+	def clear(self):
+		self._entries.clear()
+		del self._frames[:]
+
+
+class JiggleState(object):
+	'''The simulation state of one or more jiggle points, kept in contiguous (n, 3) buffers.'''
+
+	def __init__(self):
+		self.initialized = False
+		self.curr_pos = np.zeros((0, 3))
+		self.prev_pos = np.zeros((0, 3))
+		self.prev_goal = np.zeros((0, 3))
+		self.prev_time = 0.0
+		# fraction of a substep that has elapsed but not yet been integrated
+		self.accumulator = 0.0
+		# the stiffness and damping of the last step, a sleeping state wakes up when they change
+		self.prev_stiffness = None
+		self.prev_damping = None
+		self.asleep = False
+		# the wall clock time of the last interactive step, while the time does not change
+		self.wall_time = None
+		self.cache = FrameCache()
+
+	def reset(self, goal, curr_time):
+		# set the curr and prev pos to the goal to avoid an extreme jiggle
+		# from the default value (0) to the goal
+		self.curr_pos = goal.copy()
+		self.prev_pos = goal.copy()
+		self.prev_goal = goal.copy()
+		self.prev_time = curr_time
+		self.accumulator = 0.0
+		self.asleep = False
+		self.initialized = True
+
+	def clear(self):
+		self.initialized = False
+		self.cache.clear()
+
+	def restore(self, frame, entry):
+		self.curr_pos = entry.curr_pos
+		self.prev_pos = entry.prev_pos
+		self.prev_goal = entry.goal
+		self.prev_time = frame
+		self.accumulator = entry.accumulator
+		self.asleep = False
+		self.initialized = True
+
+	def write_checkpoint(self, path):
+		'''Writes the state to a compact binary .npz file, the layout is shared with jiggle_solver.py.'''
+		with open(path, 'wb') as f:
+			np.savez(f, curr_pos=self.curr_pos, prev_pos=self.prev_pos, prev_goal=self.prev_goal,
+				time=self.prev_time, accumulator=self.accumulator)
+
+	def read_checkpoint(self, path):
+		with np.load(path) as checkpoint:
+			self.curr_pos = checkpoint['curr_pos']
+			self.prev_pos = checkpoint['prev_pos']
+			self.prev_goal = checkpoint['prev_goal']
+			self.prev_time = float(checkpoint['time'])
+			self.accumulator = float(checkpoint['accumulator'])
+		self.asleep = False
+		self.initialized = True
+
+	def integrate(self, goal, stiffness, damping):
+		'''Returns the positions one step on, states with constraints between the points override this.'''
+		return jiggle_step(self.curr_pos, self.prev_pos, goal, stiffness, damping)
+
+	def inputs_changed(self, goal, stiffness, damping):
+		return not (np.array_equal(goal, self.prev_goal) and
+			np.array_equal(stiffness, self.prev_stiffness) and
+			np.array_equal(damping, self.prev_damping))
+
+	def step(self, goal, stiffness, damping, curr_time, substeps=1, max_steps=50, cache_size=0, sleep_epsilon=0.0,
+		interactive_rate=0.0):
+		'''Advance the state to curr_time, returns the new positions or None if the sim was reset.
+
+		The elapsed time is integrated in fixed steps of 1/substeps frame, so skipped frames are
+		caught up instead of resetting the sim. At most max_steps steps are taken per call, any
+		time beyond that is dropped.
+
+		With a cache_size the state of the last cache_size evaluated frames is kept, so going back
+		to a simulated frame is a lookup and any other frame resumes from the nearest earlier one.
+		A cached frame is only checked against the inputs of its own frame: when they changed it is
+		simulated again and every later cached frame is dropped. An edit that only changes the
+		inputs of earlier frames, e.g. a moved key on the goal animation, is not seen by the later
+		cached frames until one of the edited frames is evaluated again. The nodes drop the whole
+		cache when a stiffness, damping or step setting that is not animated changes.
+
+		With a sleep_epsilon the state goes to sleep once every point moves less than sleep_epsilon
+		per step and is within sleep_epsilon of its goal. A sleeping state is not integrated until
+		the goal, stiffness or damping changes.
+
+		Evaluations at the same time (e.g. while dragging the goal) step one frame each, or with an
+		interactive_rate they step interactive_rate frames per wall clock second. Then evaluations
+		that come in faster than that are coalesced, and evaluations where the goal did not move
+		are not integrated at all. At most max_interactive_elapsed seconds count per evaluation.
+		'''
+
+		# a different number of points makes the old states useless
+		if len(goal) != len(self.curr_pos):
+			self.clear()
+
+		if cache_size > 0:
+			entry = self.cache.get(curr_time)
+			if entry is not None:
+				if entry.matches(goal, stiffness, damping, substeps):
+					self.restore(curr_time, entry)
+					return self.curr_pos
+				# an input changed, so this frame and everything simulated after it is stale
+				self.cache.invalidate_from(curr_time)
+
+			# resume from the nearest earlier frame if it is closer than the current state
+			frame = self.cache.nearest_before(curr_time)
+			if frame is not None and (not self.initialized or self.prev_time < frame or self.prev_time > curr_time):
+				self.restore(frame, self.cache.get(frame))
+
+		# when the state is first used, start at the goal
+		if not self.initialized:
+			self.reset(goal, curr_time)
+
+		# going back in time without a cached frame to resume from resets the sim
+		time_diff = curr_time - self.prev_time
+		if time_diff < 0.0:
+			self.initialized = False
+			self.prev_time = curr_time
+			return None
+
+		# note that we will evaluate the jiggle if the timestep is 0, this will
+		# allow interactive simulation (when the user interacts with the node,
+		# but the timeslider is not playing)
+		if time_diff == 0.0 and interactive_rate > 0.0:
+			# every evaluation uses up the wall time since the one before it, so the step rate does not
+			# depend on how often the node is evaluated. the first evaluation steps one frame, and a
+			# pause, e.g. before the next drag, counts as at most max_interactive_elapsed
+			now = time.time()
+			if self.wall_time is None:
+				elapsed = 1.0 / interactive_rate
+			else:
+				elapsed = min(now - self.wall_time, max_interactive_elapsed)
+			self.wall_time = now
+
+			if np.array_equal(goal, self.prev_goal):
+				steps = 0
+			else:
+				self.accumulator += elapsed * interactive_rate * substeps
+				steps = int(self.accumulator)
+				self.accumulator -= steps
+		elif time_diff == 0.0:
+			steps = substeps
+		else:
+			self.accumulator += time_diff * substeps
+			steps = int(self.accumulator)
+			self.accumulator -= steps
+			self.wall_time = None
+
+		if steps > max_steps:
+			steps = max_steps
+			self.accumulator = 0.0
+
+		if self.asleep:
+			if self.inputs_changed(goal, stiffness, damping):
+				self.asleep = False
+			else:
+				steps = 0
+				self.accumulator = 0.0
+
+		# stiffness and damping are given per frame, convert them to per substep rates
+		step_stiffness, step_damping = substep_rates(stiffness, damping, substeps)
+
+		# the goal is interpolated over the steps so that a catch up does not snap to the goal
+		for i in range(steps):
+			weight = (i + 1.0) / steps
+			sub_goal = self.prev_goal + (goal - self.prev_goal) * weight
+			new_pos = self.integrate(sub_goal, step_stiffness, step_damping)
+
+			# store the states for the next step
+			self.prev_pos = self.curr_pos
+			self.curr_pos = new_pos
+
+		if steps and sleep_epsilon > 0.0:
+			self.asleep = (np.all(np.abs(self.curr_pos - self.prev_pos) < sleep_epsilon) and
+				np.all(np.abs(goal - self.curr_pos) < sleep_epsilon))
+
+		# a coalesced interactive evaluation keeps the last integrated goal, so that the next
+		# step interpolates over the whole move
+		if steps or time_diff != 0.0:
+			self.prev_goal = goal
+		self.prev_stiffness = stiffness
+		self.prev_damping = damping
+		self.prev_time = curr_time
+
+		if cache_size > 0:
+			self.cache.add(curr_time, CachedFrame(self.curr_pos, self.prev_pos, goal, self.accumulator,
+				stiffness, damping, substeps), cache_size)
+
+		return self.curr_pos
+
+
+class ChainState(JiggleState):
+	'''The state of a jiggle chain, the points are ordered from the root to the tip.
+
+	The root follows its goal. Every other point is pulled towards its goal carried along with
+	its solved parent, so a link reacts to its parent within the same step instead of a frame
+	later, and optionally keeps its rest length to the parent.
+	'''
+
+	def __init__(self):
+		JiggleState.__init__(self)
+		self.preserve_length = False
+
+	def integrate(self, goal, stiffness, damping):
+		velocity = (self.curr_pos - self.prev_pos) * (1.0 - damping)
+		new_pos = self.curr_pos + velocity
+		new_pos[0] = goal[0]
+
+		rest_lengths = np.sqrt(((goal[1:] - goal[:-1]) ** 2).sum(axis=1))
+		for i in range(1, len(new_pos)):
+			link_goal = goal[i] + new_pos[i - 1] - goal[i - 1]
+			new_pos[i] += (link_goal - new_pos[i]) * stiffness
+
+			if self.preserve_length:
+				link = new_pos[i] - new_pos[i - 1]
+				length = math.sqrt(link.dot(link))
+				if length > 0.0:
+					new_pos[i] = new_pos[i - 1] + link * (rest_lengths[i - 1] / length)
+
+		return new_pos
+
+
+def aim_rotations(from_vecs, to_vecs):
+	'''Returns the (n, 3, 3) shortest rotations, for row vectors, that turn each from_vec to its to_vec.'''
+	from_n = from_vecs / np.maximum(np.linalg.norm(from_vecs, axis=1), 1e-12)[:, None]
+	to_n = to_vecs / np.maximum(np.linalg.norm(to_vecs, axis=1), 1e-12)[:, None]
+
+	axis = np.cross(from_n, to_n)
+	sin = np.linalg.norm(axis, axis=1)
+	cos = (from_n * to_n).sum(axis=1)
+	axis /= np.maximum(sin, 1e-12)[:, None]
+
+	# rodrigues rotation, transposed since maya multiplies row vectors from the left
+	x, y, z = axis[:, 0], axis[:, 1], axis[:, 2]
+	skew = np.zeros((len(axis), 3, 3))
+	skew[:, 0, 1] = -z
+	skew[:, 0, 2] = y
+	skew[:, 1, 0] = z
+	skew[:, 1, 2] = -x
+	skew[:, 2, 0] = -y
+	skew[:, 2, 1] = x
+	rotations = (np.eye(3) * cos[:, None, None] + skew * sin[:, None, None] +
+		axis[:, :, None] * axis[:, None, :] * (1.0 - cos)[:, None, None])
+
+	# opposite vectors have no rotation axis, turn them half a revolution about any axis
+	# perpendicular to the from_vec instead of mirroring them
+	flipped = (sin < 1e-9) & (cos < 0.0)
+	if flipped.any():
+		from_flipped = from_n[flipped]
+		helper = np.eye(3)[np.abs(from_flipped).argmin(axis=1)]
+		perpendicular = np.cross(from_flipped, helper)
+		perpendicular /= np.linalg.norm(perpendicular, axis=1)[:, None]
+		rotations[flipped] = 2.0 * perpendicular[:, :, None] * perpendicular[:, None, :] - np.eye(3)
+
+	return rotations.transpose(0, 2, 1)
+
+
+def from_mmatrix(matrix):
+	'''Returns an MMatrix as a (4, 4) array.'''
+	return np.array([[matrix(row, column) for column in range(4)] for row in range(4)])
+
+
+def to_mmatrix(matrix):
+	m = OpenMaya.MMatrix()
+	OpenMaya.MScriptUtil.createMatrixFromList([float(value) for value in matrix.ravel()], m)
+	return m
+
+
+def context_key(data):
+	'''Keeps the states of the normal context and of other contexts, e.g. a background cache fill,
+	apart so that evaluating one does not throw away the history of the other.'''
+	return data.context().isNormal()
+
+
+def array_attribute(plug):
+	'''Returns the attribute of the multi a plug belongs to, walking up from children and elements.'''
+	while plug.isChild() or plug.isElement():
+		if plug.isChild():
+			plug = plug.parent()
+		else:
+			plug = plug.array()
+	return plug.attribute()
+
+
+def clear_stale_caches(plug, attrs, states):
+	'''Drops the cached frames of the states when a plug of attrs gets a new value that is not
+	connected, e.g. a stiffness typed in the channel box. Such a value changes every frame, so a
+	cached frame before the current one could be resumed from with the old value.'''
+	if not plug.isDestination() and array_attribute(plug) in attrs:
+		for state in states:
+			state.cache.clear()
+
+
+def points_to_array(points):
+	'''Returns an MPointArray as a (n, 3) array, copied out in one call through a double4 buffer.'''
+	count = points.length()
+	if not count:
+		return np.zeros((0, 3))
+	util = OpenMaya.MScriptUtil()
+	util.createFromList([0.0] * (count * 4), count * 4)
+	ptr = util.asDouble4Ptr()
+	points.get(ptr)
+	buffer = (ctypes.c_double * (count * 4)).from_address(int(ptr))
+	return np.ctypeslib.as_array(buffer).reshape(count, 4)[:, :3].copy()
+
+
+def array_to_points(positions):
+	'''Returns a (n, 3) array as an MPointArray, copied in one call through a double4 buffer.'''
+	count = len(positions)
+	buffer = np.ones((count, 4))
+	buffer[:, :3] = positions
+	util = OpenMaya.MScriptUtil()
+	util.createFromList(buffer.ravel().tolist(), count * 4)
+	return OpenMaya.MPointArray(util.asDouble4Ptr(), count)
+
+
+def read_float_array(h_array, indices, default):
+	'''Reads a float multi into a (n, 1) array ordered by indices, missing elements get the default.'''
+	values = {}
+	for i in range(h_array.elementCount()):
+		h_array.jumpToArrayElement(i)
+		values[h_array.elementIndex()] = h_array.inputValue().asFloat()
+	return np.array([values.get(index, default) for index in indices]).reshape(-1, 1)
+
 
 class PetJiggleTransform(OpenMayaMPx.MPxNode):
 
 	kPluginNodeId = OpenMaya.MTypeId(0x00000010)
 
+	# checkpoint modes
+	kCheckpointOff = 0
+	kCheckpointWrite = 1
+	kCheckpointRead = 2
+
 	out_output = OpenMaya.MObject()
 	in_goal = OpenMaya.MObject()
 	in_damping = OpenMaya.MObject()
 	in_stiffness = OpenMaya.MObject()
 	in_time = OpenMaya.MObject()
+	in_substeps = OpenMaya.MObject()
+	in_max_steps = OpenMaya.MObject()
+	in_cache_size = OpenMaya.MObject()
+	in_checkpoint_mode = OpenMaya.MObject()
+	in_checkpoint_dir = OpenMaya.MObject()
+	in_sleep_threshold = OpenMaya.MObject()
+	in_interactive_rate = OpenMaya.MObject()
+
+	# array mode, one element per jiggle point
+	out_output_array = OpenMaya.MObject()
+	in_goal_array = OpenMaya.MObject()
+	in_stiffness_array = OpenMaya.MObject()
+	in_damping_array = OpenMaya.MObject()
+
+	# matrix mode, the goal matrix is jiggled as a whole
+	out_output_matrix = OpenMaya.MObject()
+	in_goal_matrix = OpenMaya.MObject()
+	in_rotation_stiffness = OpenMaya.MObject()
+	in_rotation_damping = OpenMaya.MObject()
 
 	def __init__(self):
 		OpenMayaMPx.MPxNode.__init__(self)
-		self._initialized = False
-		self._curr_pos = OpenMaya.MPoint()
-		self._prev_pos = OpenMaya.MPoint()
-		self._prev_time = OpenMaya.MTime()
+		# the states by checkpoint suffix ('' or '_array') and context
+		self._states = {}
+		self._array_indices = []
+
+	def schedulingType(self):
+		# a node only touches its own state, so it can be evaluated in parallel with other nodes
+		return OpenMayaMPx.MPxNode.kParallel
+
+	def setDependentsDirty(self, plug, plug_array):
+		clear_stale_caches(plug, (PetJiggleTransform.in_stiffness, PetJiggleTransform.in_damping,
+			PetJiggleTransform.in_substeps, PetJiggleTransform.in_max_steps, PetJiggleTransform.in_stiffness_array,
+			PetJiggleTransform.in_damping_array, PetJiggleTransform.in_rotation_stiffness,
+			PetJiggleTransform.in_rotation_damping), self._states.values())
+		return OpenMayaMPx.MPxNode.setDependentsDirty(self, plug, plug_array)
+
+	def state(self, data, suffix):
+		key = (suffix, context_key(data))
+		state = self._states.get(key)
+		if state is None:
+			state = self._states[key] = JiggleState()
+		return state
 
 	def compute(self, plug, data):
-		if plug != PetJiggleTransform.out_output:
+		# the plain outputs are tested first, only an outputArray element needs its multi looked up
+		if plug == PetJiggleTransform.out_output:
+			self.compute_single(plug, data)
+		elif plug == PetJiggleTransform.out_output_matrix:
+			self.compute_matrix(plug, data)
+		elif array_attribute(plug) == PetJiggleTransform.out_output_array:
+			self.compute_array(plug, data)
+		else:
 			return OpenMaya.kUnknownParameter
 
+	def compute_single(self, plug, data):
 		# get the inputs
 		damping = data.inputValue(self.in_damping).asFloat()
 		stiffness = data.inputValue(self.in_stiffness).asFloat()
-		goal = OpenMaya.MPoint(data.inputValue(self.in_goal).asFloatVector())
-		# make sure that node refreshes it self
-		curr_time = data.inputValue(self.in_time).asTime()
+		goal_vec = data.inputValue(self.in_goal).asFloatVector()
+		goal = np.array([[goal_vec.x, goal_vec.y, goal_vec.z]])
 
-		# when the node is first used, set the curr and prev pos to the goal
-		# to avoid an extreme jiggle from the default value (0) to the goal
-		if not self._initialized:
-			self._prev_time = curr_time
-			self._curr_pos = goal
-			self._prev_pos = goal
-			self._initialized = True
+		new_pos = self.simulate(data, self.state(data, ''), '', goal, stiffness, damping)
+		if new_pos is None:
+			data.setClean(plug)
+			return
 
-		# check if the timestep is just 1 frame since we want a stable simulation
-		# note that we will evaluate the jiggle if the timestep is 0, this will
-		# allow interactive simulation (when the user interacts with the node,
-		# but the timeslider is not playing)
-		time_diff = curr_time.value() - self._prev_time.value()
-		if time_diff > 1.0 or time_diff < 0.0:
-			self._initialized = False
-			self._prev_time = curr_time
+		h_output = data.outputValue(PetJiggleTransform.out_output)
+		h_output.set3Float(new_pos[0, 0], new_pos[0, 1], new_pos[0, 2])
+		h_output.setClean()
+		data.setClean(plug)
+
+	def compute_array(self, plug, data):
+		# get the inputs, the per element stiffness and damping falls back to the
+		# node stiffness and damping for goals that have no matching element
+		damping = data.inputValue(self.in_damping).asFloat()
+		stiffness = data.inputValue(self.in_stiffness).asFloat()
+
+		h_goal_array = data.inputArrayValue(self.in_goal_array)
+		count = h_goal_array.elementCount()
+		indices = []
+		goal = np.empty((count, 3))
+		for i in range(count):
+			h_goal_array.jumpToArrayElement(i)
+			indices.append(h_goal_array.elementIndex())
+			goal_vec = h_goal_array.inputValue().asFloatVector()
+			goal[i] = (goal_vec.x, goal_vec.y, goal_vec.z)
+
+		stiffness_array = read_float_array(data.inputArrayValue(self.in_stiffness_array), indices, stiffness)
+		damping_array = read_float_array(data.inputArrayValue(self.in_damping_array), indices, damping)
+
+		# a changed set of goals invalidates the buffers and the cached frames
+		if indices != self._array_indices:
+			for (suffix, _), state in self._states.items():
+				if suffix == '_array':
+					state.clear()
+			self._array_indices = indices
+
+		new_pos = self.simulate(data, self.state(data, '_array'), '_array', goal, stiffness_array, damping_array)
+		if new_pos is None:
 			data.setClean(plug)
 			return
 
-		velocity = (self._curr_pos - self._prev_pos) * (1.0 - damping)
-		new_pos = self._curr_pos + velocity
-		goal_force = (goal - new_pos) * stiffness
-		new_pos += goal_force
+		h_output_array = data.outputArrayValue(PetJiggleTransform.out_output_array)
+		builder = OpenMaya.MArrayDataBuilder(data, PetJiggleTransform.out_output_array, count)
+		for index, pos in zip(indices, new_pos):
+			builder.addElement(index).set3Float(pos[0], pos[1], pos[2])
+		h_output_array.set(builder)
+		h_output_array.setAllClean()
+		data.setClean(plug)
 
-		# store the states for the next computation
-		self._prev_pos = OpenMaya.MPoint(self._curr_pos)
-		self._curr_pos = OpenMaya.MPoint(new_pos)
-		self._prev_time = OpenMaya.MTime(curr_time)
+	def compute_matrix(self, plug, data):
+		# get the inputs
+		damping = data.inputValue(self.in_damping).asFloat()
+		stiffness = data.inputValue(self.in_stiffness).asFloat()
+		rotation_damping = data.inputValue(self.in_rotation_damping).asFloat()
+		rotation_stiffness = data.inputValue(self.in_rotation_stiffness).asFloat()
+		goal_matrix = from_mmatrix(data.inputValue(self.in_goal_matrix).asMatrix())
 
-		h_output = data.outputValue(PetJiggleTransform.out_output)
-		out_vec = OpenMaya.MFloatVector(new_pos.x, new_pos.y, new_pos.z)
-		h_output.setMFloatVector(out_vec)
-		h_output.setClean()
+		# the translation and the directions of the x and y axes are jiggled as three points, the
+		# axes with the rotation stiffness and damping, which gives a rotational spring
+		scale = np.sqrt((goal_matrix[:3, :3] ** 2).sum(axis=1))
+		axes = goal_matrix[:3, :3] / np.maximum(scale, 1e-12)[:, None]
+		goal = np.array([goal_matrix[3, :3], axes[0], axes[1]])
+		stiffness_array = np.array([[stiffness], [rotation_stiffness], [rotation_stiffness]])
+		damping_array = np.array([[damping], [rotation_damping], [rotation_damping]])
+
+		new_pos = self.simulate(data, self.state(data, '_matrix'), '_matrix', goal, stiffness_array, damping_array)
+		if new_pos is None:
+			data.setClean(plug)
+			return
+
+		# rebuild an orthonormal frame from the jiggled axes, keeping the scale and handedness of the goal
+		x_axis = new_pos[1] / max(math.sqrt(new_pos[1].dot(new_pos[1])), 1e-12)
+		y_axis = new_pos[2] - x_axis * x_axis.dot(new_pos[2])
+		y_axis /= max(math.sqrt(y_axis.dot(y_axis)), 1e-12)
+		z_axis = np.cross(x_axis, y_axis)
+		if np.linalg.det(axes) < 0.0:
+			z_axis = -z_axis
+
+		out_matrix = goal_matrix.copy()
+		out_matrix[0, :3] = x_axis * scale[0]
+		out_matrix[1, :3] = y_axis * scale[1]
+		out_matrix[2, :3] = z_axis * scale[2]
+		out_matrix[3, :3] = new_pos[0]
+
+		h_output_matrix = data.outputValue(PetJiggleTransform.out_output_matrix)
+		h_output_matrix.setMMatrix(to_mmatrix(out_matrix))
+		h_output_matrix.setClean()
 		data.setClean(plug)
 
+	def simulate(self, data, state, checkpoint_suffix, goal, stiffness, damping):
+		'''Steps a state to the current time, reading and writing checkpoints if enabled.'''
+
+		# make sure that node refreshes it self
+		curr_time = data.inputValue(self.in_time).asTime().value()
+		substeps = data.inputValue(self.in_substeps).asInt()
+		max_steps = data.inputValue(self.in_max_steps).asInt()
+		cache_size = data.inputValue(self.in_cache_size).asInt()
+		sleep_epsilon = data.inputValue(self.in_sleep_threshold).asFloat()
+		interactive_rate = data.inputValue(self.in_interactive_rate).asFloat()
+
+		checkpoint_mode = data.inputValue(self.in_checkpoint_mode).asShort()
+		checkpoint_dir = data.inputValue(self.in_checkpoint_dir).asString()
+		if checkpoint_mode != PetJiggleTransform.kCheckpointOff and checkpoint_dir:
+			name = OpenMaya.MFnDependencyNode(self.thisMObject()).name() + checkpoint_suffix
+		else:
+			checkpoint_mode = PetJiggleTransform.kCheckpointOff
+
+		# a chunk that starts mid shot continues from the checkpoint of the frame before it
+		# instead of starting at rest on the goal
+		if checkpoint_mode == PetJiggleTransform.kCheckpointRead and not state.initialized:
+			path = checkpoint_path(checkpoint_dir, name, curr_time - 1.0)
+			if os.path.exists(path):
+				state.read_checkpoint(path)
+
+		# a checkpoint is only written when the frame advances, not for evaluations at the same time
+		# or when scrubbing back
+		advanced = not state.initialized or curr_time > state.prev_time
+		new_pos = state.step(goal, stiffness, damping, curr_time, substeps, max_steps, cache_size, sleep_epsilon,
+			interactive_rate)
+
+		if checkpoint_mode == PetJiggleTransform.kCheckpointWrite and advanced and new_pos is not None:
+			state.write_checkpoint(checkpoint_path(checkpoint_dir, name, curr_time))
+
+		return new_pos
+
 
 # creates the object for maya
 def creator():
@@ -75,6 +617,9 @@ def initialize():
 	
 	n_attr = OpenMaya.MFnNumericAttribute()
 	u_attr = OpenMaya.MFnUnitAttribute()
+	e_attr = OpenMaya.MFnEnumAttribute()
+	t_attr = OpenMaya.MFnTypedAttribute()
+	m_attr = OpenMaya.MFnMatrixAttribute()
 	
 	# add output (point) attr
 	PetJiggleTransform.out_output = n_attr.createPoint('output', 'o')
@@ -110,15 +655,490 @@ def initialize():
 	PetJiggleTransform.addAttribute(PetJiggleTransform.in_time)
 	PetJiggleTransform.attributeAffects(PetJiggleTransform.in_time, PetJiggleTransform.out_output)
 
+	# add substeps (int) in attr
+	# each frame is integrated in this many fixed steps, more substeps follow a fast moving goal more smoothly
+	PetJiggleTransform.in_substeps = n_attr.create('substeps', 'ss', OpenMaya.MFnNumericData.kInt, 1)
+	n_attr.setKeyable(True)
+	n_attr.setMin(1)
+	n_attr.setSoftMax(10)
+	PetJiggleTransform.addAttribute(PetJiggleTransform.in_substeps)
+	PetJiggleTransform.attributeAffects(PetJiggleTransform.in_substeps, PetJiggleTransform.out_output)
+
+	# add max steps (int) in attr
+	# caps the number of steps taken to catch up when frames are skipped
+	PetJiggleTransform.in_max_steps = n_attr.create('maxSteps', 'ms', OpenMaya.MFnNumericData.kInt, 50)
+	n_attr.setMin(1)
+	PetJiggleTransform.addAttribute(PetJiggleTransform.in_max_steps)
+	PetJiggleTransform.attributeAffects(PetJiggleTransform.in_max_steps, PetJiggleTransform.out_output)
+
+	# add cache size (int) in attr
+	# the number of simulated frames to keep, so scrubbing back does not reset the sim. 0 disables the cache.
+	# after editing the goal animation, play through the edited frames to refresh the frames after them
+	PetJiggleTransform.in_cache_size = n_attr.create('cacheSize', 'cs', OpenMaya.MFnNumericData.kInt, 500)
+	n_attr.setMin(0)
+	PetJiggleTransform.addAttribute(PetJiggleTransform.in_cache_size)
+	PetJiggleTransform.attributeAffects(PetJiggleTransform.in_cache_size, PetJiggleTransform.out_output)
+
+	# add checkpoint mode (enum) in attr
+	# write saves the state of every evaluated frame to the checkpoint directory, read lets a
+	# sim that starts mid shot (e.g. a farm chunk) continue from the checkpoint of the frame before
+	PetJiggleTransform.in_checkpoint_mode = e_attr.create('checkpointMode', 'cm', PetJiggleTransform.kCheckpointOff)
+	e_attr.addField('off', PetJiggleTransform.kCheckpointOff)
+	e_attr.addField('write', PetJiggleTransform.kCheckpointWrite)
+	e_attr.addField('read', PetJiggleTransform.kCheckpointRead)
+	PetJiggleTransform.addAttribute(PetJiggleTransform.in_checkpoint_mode)
+	PetJiggleTransform.attributeAffects(PetJiggleTransform.in_checkpoint_mode, PetJiggleTransform.out_output)
+
+	# add checkpoint directory (string) in attr
+	PetJiggleTransform.in_checkpoint_dir = t_attr.create('checkpointDirectory', 'cd', OpenMaya.MFnData.kString)
+	t_attr.setUsedAsFilename(True)
+	PetJiggleTransform.addAttribute(PetJiggleTransform.in_checkpoint_dir)
+	PetJiggleTransform.attributeAffects(PetJiggleTransform.in_checkpoint_dir, PetJiggleTransform.out_output)
+
+	# add sleep threshold (float) in attr
+	# once the jiggle has settled within this distance it sleeps, and is not integrated
+	# until the goal, stiffness or damping changes. 0 disables sleeping
+	PetJiggleTransform.in_sleep_threshold = n_attr.create('sleepThreshold', 'st', OpenMaya.MFnNumericData.kFloat, 0.0001)
+	n_attr.setMin(0.0)
+	n_attr.setSoftMax(0.01)
+	PetJiggleTransform.addAttribute(PetJiggleTransform.in_sleep_threshold)
+	PetJiggleTransform.attributeAffects(PetJiggleTransform.in_sleep_threshold, PetJiggleTransform.out_output)
+
+	# add interactive rate (float) in attr
+	# while the time does not change, e.g. when dragging the goal, the jiggle is stepped at this many
+	# frames per wall clock second instead of one frame per evaluation, and is not stepped when the
+	# goal did not move. 0 steps one frame per evaluation
+	PetJiggleTransform.in_interactive_rate = n_attr.create('interactiveRate', 'ir', OpenMaya.MFnNumericData.kFloat, 0.0)
+	n_attr.setMin(0.0)
+	n_attr.setSoftMax(60.0)
+	PetJiggleTransform.addAttribute(PetJiggleTransform.in_interactive_rate)
+	PetJiggleTransform.attributeAffects(PetJiggleTransform.in_interactive_rate, PetJiggleTransform.out_output)
+
+	# array mode
+	# every connected goal element is integrated together with the others in one compute,
+	# and written to the output element with the same index. to step many jiggles at once,
+	# connect their goals to the goal array of one node instead of giving each its own node
+	PetJiggleTransform.out_output_array = n_attr.createPoint('outputArray', 'oa')
+	n_attr.setArray(True)
+	n_attr.setUsesArrayDataBuilder(True)
+	n_attr.setWritable(False)
+	n_attr.setStorable(False)
+	PetJiggleTransform.addAttribute(PetJiggleTransform.out_output_array)
+
+	PetJiggleTransform.in_goal_array = n_attr.createPoint('goalArray', 'ga')
+	n_attr.setArray(True)
+	PetJiggleTransform.addAttribute(PetJiggleTransform.in_goal_array)
+
+	# per element stiffness and damping, elements that are not set use stiffness and damping
+	PetJiggleTransform.in_stiffness_array = n_attr.create('stiffnessArray', 'sa', OpenMaya.MFnNumericData.kFloat, 1.0)
+	n_attr.setArray(True)
+	n_attr.setKeyable(True)
+	n_attr.setMin(0.0)
+	n_attr.setMax(1.0)
+	PetJiggleTransform.addAttribute(PetJiggleTransform.in_stiffness_array)
+
+	PetJiggleTransform.in_damping_array = n_attr.create('dampingArray', 'da', OpenMaya.MFnNumericData.kFloat, 1.0)
+	n_attr.setArray(True)
+	n_attr.setKeyable(True)
+	n_attr.setMin(0.0)
+	n_attr.setMax(1.0)
+	PetJiggleTransform.addAttribute(PetJiggleTransform.in_damping_array)
+
+	for attr in (PetJiggleTransform.in_goal_array, PetJiggleTransform.in_stiffness_array, PetJiggleTransform.in_damping_array,
+		PetJiggleTransform.in_stiffness, PetJiggleTransform.in_damping, PetJiggleTransform.in_time,
+		PetJiggleTransform.in_substeps, PetJiggleTransform.in_max_steps, PetJiggleTransform.in_cache_size,
+		PetJiggleTransform.in_checkpoint_mode, PetJiggleTransform.in_checkpoint_dir, PetJiggleTransform.in_sleep_threshold,
+		PetJiggleTransform.in_interactive_rate):
+		PetJiggleTransform.attributeAffects(attr, PetJiggleTransform.out_output_array)
+
+	# matrix mode
+	# the goal matrix is jiggled to the output matrix, the translation with stiffness and damping
+	# and the rotation with rotation stiffness and rotation damping, so no decompose and compose
+	# nodes are needed around the jiggle
+	PetJiggleTransform.out_output_matrix = m_attr.create('outputMatrix', 'om')
+	m_attr.setWritable(False)
+	m_attr.setStorable(False)
+	PetJiggleTransform.addAttribute(PetJiggleTransform.out_output_matrix)
+
+	PetJiggleTransform.in_goal_matrix = m_attr.create('goalMatrix', 'gm')
+	PetJiggleTransform.addAttribute(PetJiggleTransform.in_goal_matrix)
+
+	# the defaults make the rotation follow the goal, lower values give a rotational spring
+	PetJiggleTransform.in_rotation_stiffness = n_attr.create('rotationStiffness', 'rs', OpenMaya.MFnNumericData.kFloat, 1.0)
+	n_attr.setKeyable(True)
+	n_attr.setMin(0.0)
+	n_attr.setMax(1.0)
+	PetJiggleTransform.addAttribute(PetJiggleTransform.in_rotation_stiffness)
+
+	PetJiggleTransform.in_rotation_damping = n_attr.create('rotationDamping', 'rd', OpenMaya.MFnNumericData.kFloat, 1.0)
+	n_attr.setKeyable(True)
+	n_attr.setMin(0.0)
+	n_attr.setMax(1.0)
+	PetJiggleTransform.addAttribute(PetJiggleTransform.in_rotation_damping)
+
+	for attr in (PetJiggleTransform.in_goal_matrix, PetJiggleTransform.in_rotation_stiffness, PetJiggleTransform.in_rotation_damping,
+		PetJiggleTransform.in_stiffness, PetJiggleTransform.in_damping, PetJiggleTransform.in_time,
+		PetJiggleTransform.in_substeps, PetJiggleTransform.in_max_steps, PetJiggleTransform.in_cache_size,
+		PetJiggleTransform.in_checkpoint_mode, PetJiggleTransform.in_checkpoint_dir, PetJiggleTransform.in_sleep_threshold,
+		PetJiggleTransform.in_interactive_rate):
+		PetJiggleTransform.attributeAffects(attr, PetJiggleTransform.out_output_matrix)
+
+
+
+class PetJiggleChain(OpenMayaMPx.MPxNode):
+	'''Jiggles a whole chain, e.g. the joints of a tail, in one compute.'''
+
+	kPluginNodeId = OpenMaya.MTypeId(0x00000011)
+
+	out_output_matrix = OpenMaya.MObject()
+	in_goal_matrix = OpenMaya.MObject()
+	in_damping = OpenMaya.MObject()
+	in_stiffness = OpenMaya.MObject()
+	in_preserve_length = OpenMaya.MObject()
+	in_time = OpenMaya.MObject()
+	in_substeps = OpenMaya.MObject()
+	in_max_steps = OpenMaya.MObject()
+	in_cache_size = OpenMaya.MObject()
+	in_sleep_threshold = OpenMaya.MObject()
+	in_interactive_rate = OpenMaya.MObject()
+
+	def __init__(self):
+		OpenMayaMPx.MPxNode.__init__(self)
+		# the states by context
+		self._states = {}
+		self._indices = []
+
+	def schedulingType(self):
+		return OpenMayaMPx.MPxNode.kParallel
+
+	def setDependentsDirty(self, plug, plug_array):
+		clear_stale_caches(plug, (PetJiggleChain.in_stiffness, PetJiggleChain.in_damping, PetJiggleChain.in_preserve_length,
+			PetJiggleChain.in_substeps, PetJiggleChain.in_max_steps), self._states.values())
+		return OpenMayaMPx.MPxNode.setDependentsDirty(self, plug, plug_array)
+
+	def compute(self, plug, data):
+		if array_attribute(plug) != PetJiggleChain.out_output_matrix:
+			return OpenMaya.kUnknownParameter
+
+		# get the inputs
+		damping = data.inputValue(self.in_damping).asFloat()
+		stiffness = data.inputValue(self.in_stiffness).asFloat()
+		curr_time = data.inputValue(self.in_time).asTime().value()
+		substeps = data.inputValue(self.in_substeps).asInt()
+		max_steps = data.inputValue(self.in_max_steps).asInt()
+		cache_size = data.inputValue(self.in_cache_size).asInt()
+		sleep_epsilon = data.inputValue(self.in_sleep_threshold).asFloat()
+		interactive_rate = data.inputValue(self.in_interactive_rate).asFloat()
+
+		state = self._states.get(context_key(data))
+		if state is None:
+			state = self._states[context_key(data)] = ChainState()
+		state.preserve_length = data.inputValue(self.in_preserve_length).asBool()
+
+		# the goal matrices, ordered from the root to the tip by their index
+		h_goal_matrix = data.inputArrayValue(self.in_goal_matrix)
+		count = h_goal_matrix.elementCount()
+		indices = []
+		goal_matrices = np.empty((count, 4, 4))
+		for i in range(count):
+			h_goal_matrix.jumpToArrayElement(i)
+			indices.append(h_goal_matrix.elementIndex())
+			goal_matrices[i] = from_mmatrix(h_goal_matrix.inputValue().asMatrix())
+
+		order = np.argsort(indices)
+		indices = [indices[i] for i in order]
+		goal_matrices = goal_matrices[order]
+
+		if indices != self._indices:
+			for chain_state in self._states.values():
+				chain_state.clear()
+			self._indices = indices
+
+		if not count:
+			data.setClean(plug)
+			return
+
+		goal = goal_matrices[:, 3, :3].copy()
+		new_pos = state.step(goal, stiffness, damping, curr_time, substeps, max_steps, cache_size, sleep_epsilon,
+			interactive_rate)
+		if new_pos is None:
+			data.setClean(plug)
+			return
+
+		# rotate every link so that it aims at its solved child like its goal aims at the goal
+		# child, the tip has no child and takes the rotation of its parent
+		out_matrices = goal_matrices.copy()
+		out_matrices[:, 3, :3] = new_pos
+		if count > 1:
+			rotations = aim_rotations(goal[1:] - goal[:-1], new_pos[1:] - new_pos[:-1])
+			rotations = np.concatenate((rotations, rotations[-1:]))
+			out_matrices[:, :3, :3] = np.matmul(goal_matrices[:, :3, :3], rotations)
+
+		h_output_matrix = data.outputArrayValue(PetJiggleChain.out_output_matrix)
+		builder = OpenMaya.MArrayDataBuilder(data, PetJiggleChain.out_output_matrix, count)
+		for index, matrix in zip(indices, out_matrices):
+			builder.addElement(index).setMMatrix(to_mmatrix(matrix))
+		h_output_matrix.set(builder)
+		h_output_matrix.setAllClean()
+		data.setClean(plug)
+
+
+# creates the chain object for maya
+def chain_creator():
+	return OpenMayaMPx.asMPxPtr(PetJiggleChain())
+
+# creates the chain node attributes
+def chain_initialize():
+
+	n_attr = OpenMaya.MFnNumericAttribute()
+	u_attr = OpenMaya.MFnUnitAttribute()
+	m_attr = OpenMaya.MFnMatrixAttribute()
+
+	# add output (matrix) array attr
+	PetJiggleChain.out_output_matrix = m_attr.create('outputMatrix', 'om')
+	m_attr.setArray(True)
+	m_attr.setUsesArrayDataBuilder(True)
+	m_attr.setWritable(False)
+	m_attr.setStorable(False)
+	PetJiggleChain.addAttribute(PetJiggleChain.out_output_matrix)
+
+	# add goal (matrix) array in attr, one element per link ordered from the root to the tip
+	PetJiggleChain.in_goal_matrix = m_attr.create('goalMatrix', 'gm')
+	m_attr.setArray(True)
+	PetJiggleChain.addAttribute(PetJiggleChain.in_goal_matrix)
+
+	# add stiffness (float) in attr
+	PetJiggleChain.in_stiffness = n_attr.create('stiffness', 's', OpenMaya.MFnNumericData.kFloat, 1.0)
+	n_attr.setKeyable(True)
+	n_attr.setMin(0.0)
+	n_attr.setMax(1.0)
+	PetJiggleChain.addAttribute(PetJiggleChain.in_stiffness)
+
+	# add damping (float) in attr
+	PetJiggleChain.in_damping = n_attr.create('damping', 'd', OpenMaya.MFnNumericData.kFloat, 1.0)
+	n_attr.setKeyable(True)
+	n_attr.setMin(0.0)
+	n_attr.setMax(1.0)
+	PetJiggleChain.addAttribute(PetJiggleChain.in_damping)
+
+	# add preserve length (bool) in attr
+	# keeps every link at the length it has between the goals
+	PetJiggleChain.in_preserve_length = n_attr.create('preserveLength', 'pl', OpenMaya.MFnNumericData.kBoolean, True)
+	n_attr.setKeyable(True)
+	PetJiggleChain.addAttribute(PetJiggleChain.in_preserve_length)
+
+	# add time (time) in attr
+	PetJiggleChain.in_time = u_attr.create('time', 't', OpenMaya.MFnUnitAttribute.kTime, 0.0)
+	PetJiggleChain.addAttribute(PetJiggleChain.in_time)
+
+	# add substeps, max steps, cache size, sleep threshold and interactive rate in attrs, see the petJiggleTransform attrs
+	PetJiggleChain.in_substeps = n_attr.create('substeps', 'ss', OpenMaya.MFnNumericData.kInt, 1)
+	n_attr.setKeyable(True)
+	n_attr.setMin(1)
+	n_attr.setSoftMax(10)
+	PetJiggleChain.addAttribute(PetJiggleChain.in_substeps)
+
+	PetJiggleChain.in_max_steps = n_attr.create('maxSteps', 'ms', OpenMaya.MFnNumericData.kInt, 50)
+	n_attr.setMin(1)
+	PetJiggleChain.addAttribute(PetJiggleChain.in_max_steps)
+
+	PetJiggleChain.in_cache_size = n_attr.create('cacheSize', 'cs', OpenMaya.MFnNumericData.kInt, 500)
+	n_attr.setMin(0)
+	PetJiggleChain.addAttribute(PetJiggleChain.in_cache_size)
+
+	PetJiggleChain.in_sleep_threshold = n_attr.create('sleepThreshold', 'st', OpenMaya.MFnNumericData.kFloat, 0.0001)
+	n_attr.setMin(0.0)
+	n_attr.setSoftMax(0.01)
+	PetJiggleChain.addAttribute(PetJiggleChain.in_sleep_threshold)
+
+	PetJiggleChain.in_interactive_rate = n_attr.create('interactiveRate', 'ir', OpenMaya.MFnNumericData.kFloat, 0.0)
+	n_attr.setMin(0.0)
+	n_attr.setSoftMax(60.0)
+	PetJiggleChain.addAttribute(PetJiggleChain.in_interactive_rate)
+
+	for attr in (PetJiggleChain.in_goal_matrix, PetJiggleChain.in_stiffness, PetJiggleChain.in_damping,
+		PetJiggleChain.in_preserve_length, PetJiggleChain.in_time, PetJiggleChain.in_substeps,
+		PetJiggleChain.in_max_steps, PetJiggleChain.in_cache_size, PetJiggleChain.in_sleep_threshold,
+		PetJiggleChain.in_interactive_rate):
+		PetJiggleChain.attributeAffects(attr, PetJiggleChain.out_output_matrix)
+
+
+
+class PetJiggleDeformer(OpenMayaMPx.MPxDeformerNode):
+	'''Jiggles every vertex of a geometry towards its deformed position, scaled by a paintable weight.
+
+	The vertices are simulated in world space, so moving the object jiggles it. The positions
+	are read and written with one call each and integrated together in one pass.
+	'''
+
+	kPluginNodeId = OpenMaya.MTypeId(0x00000012)
+
+	in_damping = OpenMaya.MObject()
+	in_stiffness = OpenMaya.MObject()
+	in_time = OpenMaya.MObject()
+	in_substeps = OpenMaya.MObject()
+	in_max_steps = OpenMaya.MObject()
+	in_cache_size = OpenMaya.MObject()
+	in_sleep_threshold = OpenMaya.MObject()
+	in_interactive_rate = OpenMaya.MObject()
+
+	def __init__(self):
+		OpenMayaMPx.MPxDeformerNode.__init__(self)
+		# one state per deformed geometry, by geometry index and context
+		self._states = {}
+		# the (vertex indices, weights) per geometry index, read again when the weights change
+		self._weights = {}
+
+	def schedulingType(self):
+		return OpenMayaMPx.MPxNode.kParallel
+
+	def setDependentsDirty(self, plug, plug_array):
+		if plug == OpenMayaMPx.cvar.MPxDeformerNode_weightList or plug == OpenMayaMPx.cvar.MPxDeformerNode_weights:
+			self._weights.clear()
+		clear_stale_caches(plug, (PetJiggleDeformer.in_stiffness, PetJiggleDeformer.in_damping,
+			PetJiggleDeformer.in_substeps, PetJiggleDeformer.in_max_steps), self._states.values())
+		return OpenMayaMPx.MPxDeformerNode.setDependentsDirty(self, plug, plug_array)
+
+	def read_weights(self, data, it_geo, geom_index):
+		'''Returns the (n, 1) weights of the deformed vertices of a geometry.'''
+		indices = []
+		while not it_geo.isDone():
+			indices.append(it_geo.index())
+			it_geo.next()
+		it_geo.reset()
+
+		# vertices without a painted weight have a weight of 1
+		values = {}
+		h_weight_list = data.inputArrayValue(OpenMayaMPx.cvar.MPxDeformerNode_weightList)
+		try:
+			h_weight_list.jumpToElement(geom_index)
+		except RuntimeError:
+			pass
+		else:
+			h_weights = OpenMaya.MArrayDataHandle(h_weight_list.inputValue().child(OpenMayaMPx.cvar.MPxDeformerNode_weights))
+			for i in range(h_weights.elementCount()):
+				h_weights.jumpToArrayElement(i)
+				values[h_weights.elementIndex()] = h_weights.inputValue().asFloat()
+
+		return np.array([values.get(index, 1.0) for index in indices]).reshape(-1, 1)
+
+	def deform(self, data, it_geo, local_to_world, geom_index):
+		envelope = data.inputValue(OpenMayaMPx.cvar.MPxDeformerNode_envelope).asFloat()
+		damping = data.inputValue(self.in_damping).asFloat()
+		stiffness = data.inputValue(self.in_stiffness).asFloat()
+		curr_time = data.inputValue(self.in_time).asTime().value()
+		substeps = data.inputValue(self.in_substeps).asInt()
+		max_steps = data.inputValue(self.in_max_steps).asInt()
+		cache_size = data.inputValue(self.in_cache_size).asInt()
+		sleep_epsilon = data.inputValue(self.in_sleep_threshold).asFloat()
+		interactive_rate = data.inputValue(self.in_interactive_rate).asFloat()
+
+		points = OpenMaya.MPointArray()
+		it_geo.allPositions(points)
+		rest = points_to_array(points)
+		count = len(rest)
+
+		weights = self._weights.get(geom_index)
+		if weights is None or len(weights) != count:
+			weights = self.read_weights(data, it_geo, geom_index)
+			self._weights[geom_index] = weights
+
+		key = (geom_index, context_key(data))
+		state = self._states.get(key)
+		if state is None:
+			state = self._states[key] = JiggleState()
+
+		# simulate in world space
+		world_matrix = from_mmatrix(local_to_world)
+		goal = rest.dot(world_matrix[:3, :3]) + world_matrix[3, :3]
+		new_pos = state.step(goal, stiffness, damping, curr_time, substeps, max_steps, cache_size, sleep_epsilon,
+			interactive_rate)
+		if new_pos is None or not envelope:
+			return
+
+		inverse_matrix = np.linalg.inv(world_matrix)
+		local_pos = new_pos.dot(inverse_matrix[:3, :3]) + inverse_matrix[3, :3]
+		out_pos = rest + (local_pos - rest) * (weights * envelope)
+
+		it_geo.setAllPositions(array_to_points(out_pos))
+
+
+# creates the deformer object for maya
+def deformer_creator():
+	return OpenMayaMPx.asMPxPtr(PetJiggleDeformer())
+
+# creates the deformer node attributes
+def deformer_initialize():
+
+	n_attr = OpenMaya.MFnNumericAttribute()
+	u_attr = OpenMaya.MFnUnitAttribute()
+
+	# add stiffness (float) in attr
+	PetJiggleDeformer.in_stiffness = n_attr.create('stiffness', 's', OpenMaya.MFnNumericData.kFloat, 1.0)
+	n_attr.setKeyable(True)
+	n_attr.setMin(0.0)
+	n_attr.setMax(1.0)
+	PetJiggleDeformer.addAttribute(PetJiggleDeformer.in_stiffness)
+
+	# add damping (float) in attr
+	PetJiggleDeformer.in_damping = n_attr.create('damping', 'd', OpenMaya.MFnNumericData.kFloat, 1.0)
+	n_attr.setKeyable(True)
+	n_attr.setMin(0.0)
+	n_attr.setMax(1.0)
+	PetJiggleDeformer.addAttribute(PetJiggleDeformer.in_damping)
+
+	# add time (time) in attr
+	PetJiggleDeformer.in_time = u_attr.create('time', 't', OpenMaya.MFnUnitAttribute.kTime, 0.0)
+	PetJiggleDeformer.addAttribute(PetJiggleDeformer.in_time)
+
+	# add substeps, max steps, cache size, sleep threshold and interactive rate in attrs, see the petJiggleTransform attrs.
+	# a cached frame holds every vertex, so the cache is off by default
+	PetJiggleDeformer.in_substeps = n_attr.create('substeps', 'ss', OpenMaya.MFnNumericData.kInt, 1)
+	n_attr.setKeyable(True)
+	n_attr.setMin(1)
+	n_attr.setSoftMax(10)
+	PetJiggleDeformer.addAttribute(PetJiggleDeformer.in_substeps)
+
+	PetJiggleDeformer.in_max_steps = n_attr.create('maxSteps', 'ms', OpenMaya.MFnNumericData.kInt, 50)
+	n_attr.setMin(1)
+	PetJiggleDeformer.addAttribute(PetJiggleDeformer.in_max_steps)
+
+	PetJiggleDeformer.in_cache_size = n_attr.create('cacheSize', 'cs', OpenMaya.MFnNumericData.kInt, 0)
+	n_attr.setMin(0)
+	PetJiggleDeformer.addAttribute(PetJiggleDeformer.in_cache_size)
+
+	PetJiggleDeformer.in_sleep_threshold = n_attr.create('sleepThreshold', 'st', OpenMaya.MFnNumericData.kFloat, 0.0001)
+	n_attr.setMin(0.0)
+	n_attr.setSoftMax(0.01)
+	PetJiggleDeformer.addAttribute(PetJiggleDeformer.in_sleep_threshold)
+
+	PetJiggleDeformer.in_interactive_rate = n_attr.create('interactiveRate', 'ir', OpenMaya.MFnNumericData.kFloat, 0.0)
+	n_attr.setMin(0.0)
+	n_attr.setSoftMax(60.0)
+	PetJiggleDeformer.addAttribute(PetJiggleDeformer.in_interactive_rate)
+
+	for attr in (PetJiggleDeformer.in_stiffness, PetJiggleDeformer.in_damping, PetJiggleDeformer.in_time,
+		PetJiggleDeformer.in_substeps, PetJiggleDeformer.in_max_steps, PetJiggleDeformer.in_cache_size,
+		PetJiggleDeformer.in_sleep_threshold, PetJiggleDeformer.in_interactive_rate):
+		PetJiggleDeformer.attributeAffects(attr, OpenMayaMPx.cvar.MPxDeformerNode_outputGeom)
+
 
 
 # initializes the plug-in in maya
 def initializePlugin(obj):
 	fnPlugin = OpenMayaMPx.MFnPlugin(obj, 'Petfactory', '1.0', 'Any')
 	fnPlugin.registerNode('petJiggleTransform', PetJiggleTransform.kPluginNodeId, creator, initialize)
+	fnPlugin.registerNode('petJiggleChain', PetJiggleChain.kPluginNodeId, chain_creator, chain_initialize)
+	fnPlugin.registerNode('petJiggleDeformer', PetJiggleDeformer.kPluginNodeId, deformer_creator, deformer_initialize,
+		OpenMayaMPx.MPxNode.kDeformerNode)
+	# make the deformer weights paintable with the paint attributes tool
+	OpenMaya.MGlobal.executeCommand('makePaintable -attrType multiFloat -sm deformer petJiggleDeformer weights;')
 
 # uninitializes the plug-in in maya
 
 def uninitializePlugin(obj):
 	fnPlugin = OpenMayaMPx.MFnPlugin(obj)
 	fnPlugin.deregisterNode(PetJiggleTransform.kPluginNodeId)
+	fnPlugin.deregisterNode(PetJiggleChain.kPluginNodeId)
+	fnPlugin.deregisterNode(PetJiggleDeformer.kPluginNodeId)
+	OpenMaya.MGlobal.executeCommand('makePaintable -remove petJiggleDeformer weights;')
@@ -0,0 +1,52 @@
+'''Maya free parts of the petJiggleTransform integration.
+
+Shared by the plug-in and by jiggle_solver.py, so the node and the batch solver step the points,
+convert the substep rates and name their checkpoints the same way. Keep this file next to
+PetJiggleTransform.py.
+'''
+import os
+import numpy as np
+
+
+def jiggle_step(curr_pos, prev_pos, goal, stiffness, damping):
+	'''Integrate a (n, 3) block of jiggle points one step.
+	stiffness and damping are floats or (n, 1) arrays, so every point is stepped in one pass.
+	'''
+	velocity = (curr_pos - prev_pos) * (1.0 - damping)
+	new_pos = curr_pos + velocity
+	goal_force = (goal - new_pos) * stiffness
+	new_pos += goal_force
+	return new_pos
+
+
+def substep_rates(stiffness, damping, substeps):
+	'''Converts the per frame stiffness and damping to per substep rates.
+	stiffness and damping are floats or (n, 1) arrays.
+
+	With a fixed goal the offset to the goal follows a second order recurrence, whose two roots
+	are the decay and swing per step. The per substep rates are picked so that their roots are the
+	substeps-th roots of the per frame ones, so any number of substeps settles at the same per frame
+	rate as a single step. A stiffness of 1 still follows the goal exactly, and with a damping of 1
+	the substeps match a single step exactly.
+	'''
+	if substeps <= 1:
+		return stiffness, damping
+
+	keep = 1.0 - np.asarray(stiffness, dtype=float)
+	carry = 1.0 - np.asarray(damping, dtype=float)
+	root_sum = keep * (1.0 + carry)
+	root_product = keep * carry
+	discriminant = np.sqrt((root_sum * root_sum - 4.0 * root_product).astype(complex))
+	root_a = ((root_sum + discriminant) * 0.5) ** (1.0 / substeps)
+	root_b = ((root_sum - discriminant) * 0.5) ** (1.0 / substeps)
+
+	step_product = (root_a * root_b).real
+	step_keep = (root_a + root_b).real - step_product
+	step_carry = np.where(step_keep > 1e-12, step_product / np.maximum(step_keep, 1e-12), 0.0)
+	return 1.0 - step_keep, 1.0 - step_carry
+
+
+def checkpoint_path(directory, name, frame):
+	'''The checkpoint file of a named state at a frame, e.g. jiggle1.101.npz'''
+	frame_str = ('%.3f' % frame).rstrip('0').rstrip('.')
+	return os.path.join(directory, '%s.%s.npz' % (name.replace(':', '_').replace('|', '_'), frame_str))
@@ -0,0 +1,37 @@
+import json
+import maya.cmds as cmds
+import pymel.core as pm
+
+# delete all nodes, and flush undo to safely unload the plugin
+pm.delete([node for node in pm.ls() if isinstance(node, pm.nodetypes.petLinkage)])
+pm.flushUndo()
+
+cmds.unloadPlugin('petLinkage.py', force=True)
+cmds.loadPlugin('petLinkage.py')
+
+# a four bar, the crank A-B driven by input[0]
+four_bar = {
+    'joints': [
+        {'name': 'A', 'position': [0, 0], 'fixed': True},
+        {'name': 'B', 'position': [0, 2]},
+        {'name': 'C', 'position': [5, 4]},
+        {'name': 'D', 'position': [6, 0], 'fixed': True}
+    ],
+    'links': [
+        {'joints': ['A', 'B'], 'crank': 0},
+        {'joints': ['B', 'C']},
+        {'joints': ['C', 'D']}
+    ]
+}
+
+node = cmds.createNode('petLinkage')
+cmds.setAttr(node + '.description', json.dumps(four_bar), type='string')
+
+for i in range(len(four_bar['links'])):
+    loc = cmds.spaceLocator(name='link{0}_loc'.format(i))[0]
+    decompose = cmds.createNode('decomposeMatrix')
+    cmds.connectAttr('{0}.outputMatrix[{1}]'.format(node, i), decompose + '.inputMatrix')
+    cmds.connectAttr(decompose + '.outputTranslate', loc + '.translate')
+    cmds.connectAttr(decompose + '.outputRotate', loc + '.rotate')
+
+cmds.expression(string='{0}.input[0] = frame * 5;'.format(node))
@@ -0,0 +1,354 @@
+import sys, math, json
+import numpy as np
+from maya import OpenMaya, OpenMayaMPx
+
+# The name of the node.
+node_name = 'petLinkage'
+
+node_classify = 'utility/general'
+
+# A unique ID associated to this node type.
+# Plugs for internal use only can use 0 - 0x7ffff.
+node_id = OpenMaya.MTypeId(0x00014)
+
+
+class Linkage(object):
+    '''
+    A planar linkage in the xy plane, parsed from a json description like this four bar:
+
+    {
+        "joints": [
+            {"name": "A", "position": [0, 0], "fixed": true},
+            {"name": "B", "position": [0, 2]},
+            {"name": "C", "position": [5, 4]},
+            {"name": "D", "position": [6, 0], "fixed": true}
+        ],
+        "links": [
+            {"joints": ["A", "B"], "crank": 0},
+            {"joints": ["B", "C"]},
+            {"joints": ["C", "D"]}
+        ]
+    }
+
+    joints
+        position: the rest position, and the start of the first solve.
+        fixed: the joint does not move.
+    links
+        joints: the two joints the link connects, its matrix sits on the first and aims at the second.
+        length: defaults to the rest distance between the joints.
+        crank: the index of the input that sets the angle of the link, in degrees.
+        actuator: the index of the input that sets the length of the link, e.g. a hydraulic cylinder.
+    sliders
+        joint: a joint that slides on the line through its rest position.
+        direction: the direction of the line.
+
+    Every link keeps the distance between its joints, which closes the loops of the linkage.
+    The free joint positions are solved with Gauss Newton iteration, warm started from the last
+    solve so the linkage stays in the same assembly and does not flip between solutions.
+    '''
+    def __init__(self, description):
+        desc = json.loads(description)
+
+        joints = desc.get('joints', [])
+        names = dict((joint['name'], i) for i, joint in enumerate(joints))
+        self.rest = np.array([joint['position'][:2] for joint in joints], dtype=np.float64).reshape(-1, 2)
+        fixed = np.array([bool(joint.get('fixed', False)) for joint in joints], dtype=bool)
+
+        # the column of the x of every joint in the jacobian, -1 for fixed joints
+        self.free = np.flatnonzero(~fixed)
+        column = np.full(len(joints), -1, dtype=np.intp)
+        column[self.free] = np.arange(len(self.free)) * 2
+
+        links = desc.get('links', [])
+        self.link_joints = np.array([[names[j] for j in link['joints']] for link in links], dtype=np.intp).reshape(-1, 2)
+        rest_vectors = self.rest[self.link_joints[:, 1]] - self.rest[self.link_joints[:, 0]]
+        self.lengths = np.array([link.get('length', 0.0) for link in links], dtype=np.float64)
+        self.lengths = np.where([('length' in link) for link in links], self.lengths,
+                                np.sqrt((rest_vectors*rest_vectors).sum(axis=1)))
+        self.rest_angles = np.degrees(np.arctan2(rest_vectors[:, 1], rest_vectors[:, 0]))
+
+        self.cranks = [(i, link['crank']) for i, link in enumerate(links) if 'crank' in link]
+        self.actuators = [(i, link['actuator']) for i, link in enumerate(links) if 'actuator' in link]
+        crank_links = set(i for i, _ in self.cranks)
+        self.distance_links = np.array([i for i in range(len(links)) if i not in crank_links], dtype=np.intp)
+        crank_index = np.array([i for i, _ in self.cranks], dtype=np.intp)
+
+        sliders = desc.get('sliders', [])
+        self.slider_joints = np.array([names[slider['joint']] for slider in sliders], dtype=np.intp)
+        directions = np.array([slider['direction'][:2] for slider in sliders], dtype=np.float64).reshape(-1, 2)
+        self.slider_normals = np.column_stack((-directions[:, 1], directions[:, 0]))
+        self.slider_origins = self.rest[self.slider_joints]
+
+        # residual rows, the distance links, then x and y of every crank, then the sliders
+        n_distance = len(self.distance_links)
+        n_crank = len(crank_index)
+        self.crank_rows = n_distance
+        self.slider_rows = n_distance + 2*n_crank
+        n_rows = self.slider_rows + len(sliders)
+
+        # the jacobian structure is built once. Crank and slider rows are constant and written to
+        # the template, only the entries of the distance rows are refilled every iteration
+        self.jacobian = np.zeros((n_rows, 2*len(self.free)))
+
+        rows, cols, links_of, axes, signs = [], [], [], [], []
+        for row, link in enumerate(self.distance_links):
+            for end, sign in ((0, -1.0), (1, 1.0)):
+                col = column[self.link_joints[link, end]]
+                if col < 0:
+                    continue
+                for axis in (0, 1):
+                    rows.append(row)
+                    cols.append(col + axis)
+                    links_of.append(row)
+                    axes.append(axis)
+                    signs.append(2.0 * sign)
+        self.entry_rows = np.array(rows, dtype=np.intp)
+        self.entry_cols = np.array(cols, dtype=np.intp)
+        self.entry_links = np.array(links_of, dtype=np.intp)
+        self.entry_axes = np.array(axes, dtype=np.intp)
+        self.entry_signs = np.array(signs)
+
+        for k, link in enumerate(crank_index):
+            for end, sign in ((0, -1.0), (1, 1.0)):
+                col = column[self.link_joints[link, end]]
+                if col < 0:
+                    continue
+                for axis in (0, 1):
+                    self.jacobian[self.crank_rows + 2*k + axis, col + axis] = sign
+
+        for k, joint in enumerate(self.slider_joints):
+            col = column[joint]
+            if col >= 0:
+                self.jacobian[self.slider_rows + k, col:col + 2] = self.slider_normals[k]
+
+        self.crank_index = crank_index
+        # the last solve, the warm start of the next
+        self.positions = self.rest.copy()
+
+    def residuals(self, positions, lengths, crank_vectors):
+        ''' The loop closure residuals of joint positions. '''
+        links = self.link_joints[self.distance_links]
+        d = positions[links[:, 1]] - positions[links[:, 0]]
+        link_lengths = lengths[self.distance_links]
+        distance = (d*d).sum(axis=1) - link_lengths*link_lengths
+
+        links = self.link_joints[self.crank_index]
+        crank = (positions[links[:, 1]] - positions[links[:, 0]] - crank_vectors).ravel()
+
+        slider = ((positions[self.slider_joints] - self.slider_origins) * self.slider_normals).sum(axis=1)
+
+        return np.concatenate((distance, crank, slider)), d
+
+    def solve(self, inputs, iterations=20, tolerance=1e-8):
+        '''
+        Solves the joint positions for the crank angles and actuator lengths in inputs, a dict of
+        input index to value. Missing inputs keep the rest angle or length.
+        Returns the (n, 2) joint positions and the remaining residual.
+        '''
+        lengths = self.lengths.copy()
+        for link, index in self.actuators:
+            lengths[link] = inputs.get(index, lengths[link])
+
+        angles = np.radians([inputs.get(index, self.rest_angles[link]) for link, index in self.cranks])
+        crank_lengths = lengths[self.crank_index]
+        crank_vectors = np.column_stack((np.cos(angles), np.sin(angles))) * crank_lengths[:, None]
+
+        positions = self.positions.copy()
+        jacobian = self.jacobian
+        free = self.free
+        residual = 0.0
+        for i in range(iterations):
+            f, d = self.residuals(positions, lengths, crank_vectors)
+            residual = math.sqrt(float((f*f).sum()))
+            if residual < tolerance or not len(free):
+                break
+
+            jacobian[self.entry_rows, self.entry_cols] = self.entry_signs * d[self.entry_links, self.entry_axes]
+            step = np.linalg.lstsq(jacobian, -f, rcond=None)[0]
+            positions[free] += step.reshape(-1, 2)
+
+        self.positions = positions
+        return positions, residual
+
+    def link_matrices(self, positions):
+        ''' Returns a 16 float row major matrix per link, on its first joint with x aimed at the second. '''
+        start = positions[self.link_joints[:, 0]]
+        d = positions[self.link_joints[:, 1]] - start
+        length = np.sqrt((d*d).sum(axis=1))
+        length[length == 0.0] = 1.0
+        c = d[:, 0] / length
+        s = d[:, 1] / length
+
+        matrices = np.zeros((len(d), 16))
+        matrices[:, 0] = c
+        matrices[:, 1] = s
+        matrices[:, 4] = -s
+        matrices[:, 5] = c
+        matrices[:, 10] = 1.0
+        matrices[:, 12] = start[:, 0]
+        matrices[:, 13] = start[:, 1]
+        matrices[:, 15] = 1.0
+        return matrices
+
+
+def array_attribute(plug):
+    ''' Returns the attribute of the multi a plug belongs to, walking up from elements. '''
+    if plug.isElement():
+        plug = plug.array()
+    return plug.attribute()
+
+
+class petLinkage(OpenMayaMPx.MPxNode):
+
+    # define attrs. This will hold a ref to the MObj that are created in the nodeInitializer
+    in_description = OpenMaya.MObject()
+    in_input = OpenMaya.MObject()
+    out_matrix = OpenMaya.MObject()
+    out_residual = OpenMaya.MObject()
+
+    def __init__(self):
+        OpenMayaMPx.MPxNode.__init__(self)
+        # the parsed description, kept until the description string changes
+        self._description = None
+        self._linkage = None
+
+    def linkage(self, description):
+        ''' Returns the Linkage of a description, parsed again only when the description changes. '''
+        if description != self._description:
+            self._description = description
+            self._linkage = None
+            if description.strip():
+                try:
+                    self._linkage = Linkage(description)
+                except (ValueError, KeyError, IndexError, TypeError) as e:
+                    sys.stderr.write('petLinkage: invalid description, %s\n' % e)
+        return self._linkage
+
+    def compute(self, plug, data_block):
+
+        if array_attribute(plug) == petLinkage.out_matrix or plug == petLinkage.out_residual:
+
+            #--------------------
+            # INPUT
+            #--------------------
+            description = data_block.inputValue(petLinkage.in_description).asString()
+
+            inputs = {}
+            in_input_arrayhandle = data_block.inputArrayValue(petLinkage.in_input)
+            for i in range(in_input_arrayhandle.elementCount()):
+                in_input_arrayhandle.jumpToArrayElement(i)
+                inputs[in_input_arrayhandle.elementIndex()] = in_input_arrayhandle.inputValue().asFloat()
+
+            #--------------------
+            # COMPUTE
+            #--------------------
+            linkage = self.linkage(description)
+            if linkage is None:
+                matrices = []
+                residual = 0.0
+            else:
+                positions, residual = linkage.solve(inputs)
+                matrices = linkage.link_matrices(positions).tolist()
+
+            #--------------------
+            # OUTPUT
+            #--------------------
+            out_matrix_arrayhandle = data_block.outputArrayValue(petLinkage.out_matrix)
+            builder = OpenMaya.MArrayDataBuilder(data_block, petLinkage.out_matrix, len(matrices))
+            for i, values in enumerate(matrices):
+                matrix = OpenMaya.MMatrix()
+                OpenMaya.MScriptUtil.createMatrixFromList(values, matrix)
+                builder.addElement(i).setMMatrix(matrix)
+            out_matrix_arrayhandle.set(builder)
+            out_matrix_arrayhandle.setAllClean()
+
+            out_residual_datahandle = data_block.outputValue(petLinkage.out_residual)
+            out_residual_datahandle.setFloat(residual)
+            out_residual_datahandle.setClean()
+
+            # mark the plug clean
+            data_block.setClean(plug)
+
+        else:
+            return OpenMaya.kUnknownParameter
+
+
+def nodeCreator():
+    # create an instance and return a pointer MObj to it
+    return OpenMayaMPx.asMPxPtr(petLinkage())
+
+def nodeInitializer():
+    mfn_attr = OpenMaya.MFnNumericAttribute()
+    mfn_typed_attr = OpenMaya.MFnTypedAttribute()
+    mfn_matrix_attr = OpenMaya.MFnMatrixAttribute()
+    kFloat = OpenMaya.MFnNumericData.kFloat
+
+    #--------------------
+    # INPUT
+    #--------------------
+    # the json description of the joints and links, see Linkage
+    petLinkage.in_description = mfn_typed_attr.create('description', 'de', OpenMaya.MFnData.kString)
+    mfn_typed_attr.setWritable(1)
+    mfn_typed_attr.setStorable(1)
+
+    # the crank angles and actuator lengths, by the input index in the description
+    petLinkage.in_input = mfn_attr.create('input', 'i', kFloat, 0.0)
+    mfn_attr.setArray(1)
+    mfn_attr.setReadable(1)
+    mfn_attr.setWritable(1)
+    mfn_attr.setStorable(1)
+    mfn_attr.setKeyable(1)
+
+    #--------------------
+    # OUTPUT
+    #--------------------
+    # one matrix per link, in the order of the description
+    petLinkage.out_matrix = mfn_matrix_attr.create('outputMatrix', 'om')
+    mfn_matrix_attr.setArray(1)
+    mfn_matrix_attr.setUsesArrayDataBuilder(1)
+    mfn_matrix_attr.setWritable(0)
+    mfn_matrix_attr.setStorable(0)
+
+    # how far the solve is from closing every loop, not 0 when the inputs can not be reached
+    petLinkage.out_residual = mfn_attr.create('residual', 'res', kFloat)
+    mfn_attr.setReadable(1)
+    mfn_attr.setWritable(0)
+    mfn_attr.setStorable(0)
+    mfn_attr.setKeyable(0)
+
+    #--------------------
+    # ADD ATTR TO NODE
+    #--------------------
+    petLinkage.addAttribute(petLinkage.in_description)
+    petLinkage.addAttribute(petLinkage.in_input)
+    petLinkage.addAttribute(petLinkage.out_matrix)
+    petLinkage.addAttribute(petLinkage.out_residual)
+
+    #--------------------
+    # SETUP DEPENDENCY
+    #--------------------
+    for in_attr in (petLinkage.in_description, petLinkage.in_input):
+        petLinkage.attributeAffects(in_attr, petLinkage.out_matrix)
+        petLinkage.attributeAffects(in_attr, petLinkage.out_residual)
+
+def initializePlugin(mobject):
+    mplugin = OpenMayaMPx.MFnPlugin(mobject)
+    try:
+        mplugin.registerNode(   node_name,
+                                node_id,
+                                nodeCreator,
+                                nodeInitializer,
+                                OpenMayaMPx.MPxNode.kDependNode,
+                                node_classify)
+    except:
+        sys.stderr.write( 'Failed to register node: ' + node_name )
+        raise
+
+
+def uninitializePlugin(mobject):
+    mplugin = OpenMayaMPx.MFnPlugin(mobject)
+    try:
+        mplugin.deregisterNode(node_id)
+    except:
+        sys.stderr.write( 'Failed to deregister node: ' + node_name )
+        raise
@@ -1,4 +1,5 @@
-import sys
+import sys, math
+import numpy as np
 from maya import OpenMaya, OpenMayaMPx
 
 # The name of the node.
@@ -10,14 +11,75 @@ node_classify = 'utility/general'
 # Plugs for internal use only can use 0 - 0x7ffff.
 node_id = OpenMaya.MTypeId(0x00007)
 
+def slerp(q1, q2, t):
+    ''' Spherical interpolation of two (x, y, z, w) quaternions at an array of parameters, returns (n, 4). '''
+    q1 = np.asarray(q1, dtype=np.float64)
+    q2 = np.asarray(q2, dtype=np.float64)
+    dot = np.dot(q1, q2)
+    # take the short way around
+    if dot < 0.0:
+        q2 = -q2
+        dot = -dot
+
+    t = t[:, None]
+    if dot > 0.9995:
+        q = q1 + (q2 - q1) * t
+    else:
+        theta = math.acos(dot)
+        q = (np.sin((1.0 - t) * theta) * q1 + np.sin(t * theta) * q2) / math.sin(theta)
+    return q / np.sqrt((q*q).sum(axis=1))[:, None]
+
+def quaternion_matrices(q):
+    ''' The (n, 3, 3) row vector rotations of (n, 4) (x, y, z, w) quaternions. '''
+    x, y, z, w = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+    m = np.empty((len(q), 3, 3))
+    m[:, 0, 0] = 1.0 - 2.0*(y*y + z*z)
+    m[:, 0, 1] = 2.0*(x*y + z*w)
+    m[:, 0, 2] = 2.0*(x*z - y*w)
+    m[:, 1, 0] = 2.0*(x*y - z*w)
+    m[:, 1, 1] = 1.0 - 2.0*(x*x + z*z)
+    m[:, 1, 2] = 2.0*(y*z + x*w)
+    m[:, 2, 0] = 2.0*(x*z + y*w)
+    m[:, 2, 1] = 2.0*(y*z - x*w)
+    m[:, 2, 2] = 1.0 - 2.0*(x*x + y*y)
+    return m
+
+def rotation_quaternion(matrix):
+    ''' The (x, y, z, w) rotation of an MMatrix, without its scale. '''
+    q = OpenMaya.MTransformationMatrix(matrix).rotation()
+    return (q.x, q.y, q.z, q.w)
+
+def top_attribute(plug):
+    ''' Returns the attribute a plug belongs to, walking up from children and elements. '''
+    while plug.isChild() or plug.isElement():
+        if plug.isChild():
+            plug = plug.parent()
+        else:
+            plug = plug.array()
+    return plug.attribute()
+
 class petMidpoint(OpenMayaMPx.MPxNode):
 
     # define attrs. This will hold a ref to the MObj that are created in the nodeInitializer
     in_matrix_1 = OpenMaya.MObject()
     in_matrix_2 = OpenMaya.MObject()
 
+    # centroid of any number of matrices
+    in_matrix = OpenMaya.MObject()
+    in_weight = OpenMaya.MObject()
+    in_average_orientation = OpenMaya.MObject()
+
     # output
     out_midpoint = OpenMaya.MObject()
+    out_centroid = OpenMaya.MObject()
+    out_centroid_matrix = OpenMaya.MObject()
+
+    # points distributed from in_matrix_1 to in_matrix_2
+    in_count = OpenMaya.MObject()
+    in_ease = OpenMaya.MObject()
+    in_interpolate_rotation = OpenMaya.MObject()
+    out_points = OpenMaya.MObject()
+    out_matrices = OpenMaya.MObject()
 
     def __init__(self):
         OpenMayaMPx.MPxNode.__init__(self)
@@ -67,6 +129,150 @@ class petMidpoint(OpenMayaMPx.MPxNode):
             # mark the plug clean
             data_block.setClean(plug)
 
+        elif plug == petMidpoint.out_centroid or plug == petMidpoint.out_centroid_matrix:
+
+            #--------------------
+            # INPUT
+            #--------------------
+            # weights that are not set are 1
+            weights = {}
+            in_weight_AH = data_block.inputArrayValue(petMidpoint.in_weight)
+            for i in range(in_weight_AH.elementCount()):
+                in_weight_AH.jumpToArrayElement(i)
+                weights[in_weight_AH.elementIndex()] = in_weight_AH.inputValue().asFloat()
+
+            average_orientation = data_block.inputValue(petMidpoint.in_average_orientation).asBool()
+
+            #--------------------
+            # COMPUTE
+            #--------------------
+            # one pass over the matrices, summing the weighted translation rows, and the x and y
+            # axis rows when the orientation is averaged, into plain floats
+            weight_sum = 0.0
+            tx = ty = tz = 0.0
+            xx = xy = xz = yx = yy = yz = 0.0
+
+            in_matrix_AH = data_block.inputArrayValue(petMidpoint.in_matrix)
+            for i in range(in_matrix_AH.elementCount()):
+                in_matrix_AH.jumpToArrayElement(i)
+                w = weights.get(in_matrix_AH.elementIndex(), 1.0)
+                if w == 0.0:
+                    continue
+                in_matrix_V = in_matrix_AH.inputValue().asMatrix()
+
+                weight_sum += w
+                tx += w * in_matrix_V(3,0)
+                ty += w * in_matrix_V(3,1)
+                tz += w * in_matrix_V(3,2)
+
+                # the axis rows are normalized first, so a scaled matrix does not weigh more
+                if average_orientation:
+                    x_len = math.sqrt(in_matrix_V(0,0)**2 + in_matrix_V(0,1)**2 + in_matrix_V(0,2)**2)
+                    y_len = math.sqrt(in_matrix_V(1,0)**2 + in_matrix_V(1,1)**2 + in_matrix_V(1,2)**2)
+                    if x_len > 0.0 and y_len > 0.0:
+                        xx += w * in_matrix_V(0,0) / x_len
+                        xy += w * in_matrix_V(0,1) / x_len
+                        xz += w * in_matrix_V(0,2) / x_len
+                        yx += w * in_matrix_V(1,0) / y_len
+                        yy += w * in_matrix_V(1,1) / y_len
+                        yz += w * in_matrix_V(1,2) / y_len
+
+            if weight_sum != 0.0:
+                tx /= weight_sum
+                ty /= weight_sum
+                tz /= weight_sum
+
+            # the averaged x axis, and the averaged y axis made orthogonal to it (gram schmidt)
+            x_len = math.sqrt(xx*xx + xy*xy + xz*xz)
+            if x_len > 0.0:
+                xx, xy, xz = xx/x_len, xy/x_len, xz/x_len
+                dot = yx*xx + yy*xy + yz*xz
+                yx, yy, yz = yx - dot*xx, yy - dot*xy, yz - dot*xz
+            y_len = math.sqrt(yx*yx + yy*yy + yz*yz)
+            if x_len > 0.0 and y_len > 0.0:
+                yx, yy, yz = yx/y_len, yy/y_len, yz/y_len
+            else:
+                xx, xy, xz, yx, yy, yz = 1.0, 0.0, 0.0, 0.0, 1.0, 0.0
+            zx, zy, zz = xy*yz - xz*yy, xz*yx - xx*yz, xx*yy - xy*yx
+
+            centroid_m = OpenMaya.MMatrix()
+            OpenMaya.MScriptUtil.createMatrixFromList([xx, xy, xz, 0, yx, yy, yz, 0, zx, zy, zz, 0, tx, ty, tz, 1], centroid_m)
+
+            #--------------------
+            # OUTPUT
+            #--------------------
+            out_centroid_DH = data_block.outputValue(petMidpoint.out_centroid)
+            out_centroid_DH.set3Float(tx, ty, tz)
+            out_centroid_DH.setClean()
+
+            out_centroid_matrix_DH = data_block.outputValue(petMidpoint.out_centroid_matrix)
+            out_centroid_matrix_DH.setMMatrix(centroid_m)
+            out_centroid_matrix_DH.setClean()
+
+            # mark the plug clean
+            data_block.setClean(plug)
+
+        elif top_attribute(plug) in (petMidpoint.out_points, petMidpoint.out_matrices):
+
+            #--------------------
+            # INPUT
+            #--------------------
+            in_matrix_1_V = data_block.inputValue(petMidpoint.in_matrix_1).asMatrix()
+            in_matrix_2_V = data_block.inputValue(petMidpoint.in_matrix_2).asMatrix()
+
+            count = max(data_block.inputValue(petMidpoint.in_count).asInt(), 0)
+            ease = data_block.inputValue(petMidpoint.in_ease).asShort()
+            interpolate_rotation = data_block.inputValue(petMidpoint.in_interpolate_rotation).asBool()
+
+            #--------------------
+            # COMPUTE
+            #--------------------
+            # the parameters run from 0 at in_matrix_1 to 1 at in_matrix_2, both ends included
+            if count == 1:
+                t = np.array([0.5])
+            else:
+                t = np.linspace(0.0, 1.0, count)
+
+            # ease in and out, the points bunch up at the ends
+            if ease == 1:
+                t = t*t*(3.0 - 2.0*t)
+
+            t_1 = np.array([in_matrix_1_V(3,0), in_matrix_1_V(3,1), in_matrix_1_V(3,2)])
+            t_2 = np.array([in_matrix_2_V(3,0), in_matrix_2_V(3,1), in_matrix_2_V(3,2)])
+            points = t_1 + (t_2 - t_1) * t[:, None]
+
+            # the rotation is slerped from in_matrix_1 to in_matrix_2, which carries the twist along
+            matrices = np.zeros((count, 4, 4))
+            if interpolate_rotation:
+                q = slerp(rotation_quaternion(in_matrix_1_V), rotation_quaternion(in_matrix_2_V), t)
+                matrices[:, :3, :3] = quaternion_matrices(q)
+            else:
+                matrices[:, :3, :3] = np.eye(3)
+            matrices[:, 3, :3] = points
+            matrices[:, 3, 3] = 1.0
+
+            #--------------------
+            # OUTPUT
+            #--------------------
+            out_points_AH = data_block.outputArrayValue(petMidpoint.out_points)
+            builder = OpenMaya.MArrayDataBuilder(data_block, petMidpoint.out_points, count)
+            for i, point in enumerate(points.tolist()):
+                builder.addElement(i).set3Float(*point)
+            out_points_AH.set(builder)
+            out_points_AH.setAllClean()
+
+            out_matrices_AH = data_block.outputArrayValue(petMidpoint.out_matrices)
+            builder = OpenMaya.MArrayDataBuilder(data_block, petMidpoint.out_matrices, count)
+            for i, m_list in enumerate(matrices.reshape(count, 16).tolist()):
+                m = OpenMaya.MMatrix()
+                OpenMaya.MScriptUtil.createMatrixFromList(m_list, m)
+                builder.addElement(i).setMMatrix(m)
+            out_matrices_AH.set(builder)
+            out_matrices_AH.setAllClean()
+
+            # mark the plug clean
+            data_block.setClean(plug)
+
         # optionally we could return unknown here, sine we expect only one output 
         # plug specified to be passed to the compute method
         else:
@@ -105,6 +311,49 @@ def nodeInitializer():
     matrix_attr.setStorable(True)
     matrix_attr.setKeyable(True)
 
+    # the matrices of the centroid, and an optional weight per matrix
+    petMidpoint.in_matrix = matrix_attr.create('in_matrix', 'im')
+    matrix_attr.setArray(True)
+    matrix_attr.setReadable(True)
+    matrix_attr.setWritable(True)
+    matrix_attr.setStorable(True)
+
+    petMidpoint.in_weight = num_attr.create('weight', 'w', OpenMaya.MFnNumericData.kFloat, 1.0)
+    num_attr.setArray(True)
+    num_attr.setReadable(True)
+    num_attr.setWritable(True)
+    num_attr.setStorable(True)
+    num_attr.setKeyable(True)
+
+    # average the x and y axes of the matrices into the rotation of outCentroidMatrix
+    petMidpoint.in_average_orientation = num_attr.create('averageOrientation', 'ao', OpenMaya.MFnNumericData.kBoolean, False)
+    num_attr.setReadable(True)
+    num_attr.setWritable(True)
+    num_attr.setStorable(True)
+
+    # the number of points distributed from in_matrix_1 to in_matrix_2
+    petMidpoint.in_count = num_attr.create('count', 'c', OpenMaya.MFnNumericData.kInt, 10)
+    num_attr.setMin(0)
+    num_attr.setReadable(True)
+    num_attr.setWritable(True)
+    num_attr.setStorable(True)
+    num_attr.setKeyable(True)
+
+    enum_attr = OpenMaya.MFnEnumAttribute()
+    petMidpoint.in_ease = enum_attr.create('ease', 'ea', 0)
+    enum_attr.addField('linear', 0)
+    enum_attr.addField('easeInOut', 1)
+    enum_attr.setReadable(True)
+    enum_attr.setWritable(True)
+    enum_attr.setStorable(True)
+    enum_attr.setKeyable(True)
+
+    # slerp the rotation of outMatrices from in_matrix_1 to in_matrix_2, otherwise they are not rotated
+    petMidpoint.in_interpolate_rotation = num_attr.create('interpolateRotation', 'ir', OpenMaya.MFnNumericData.kBoolean, True)
+    num_attr.setReadable(True)
+    num_attr.setWritable(True)
+    num_attr.setStorable(True)
+
     #--------------------
     # OUTPUT
     #--------------------
@@ -119,12 +368,50 @@ def nodeInitializer():
     num_attr.setStorable(False)
     num_attr.setKeyable(False)
 
+    # the weighted centroid of in_matrix
+    petMidpoint.out_centroid = num_attr.create('outCentroid', 'oc', k3_float)
+    num_attr.setReadable(True)
+    num_attr.setWritable(False)
+    num_attr.setStorable(False)
+    num_attr.setKeyable(False)
+
+    # the centroid, with the averaged orientation when averageOrientation is on
+    petMidpoint.out_centroid_matrix = matrix_attr.create('outCentroidMatrix', 'ocm')
+    matrix_attr.setReadable(True)
+    matrix_attr.setWritable(False)
+    matrix_attr.setStorable(False)
+
+    # the distributed points, and their matrices
+    petMidpoint.out_points = num_attr.create('outPoints', 'ops', k3_float)
+    num_attr.setArray(True)
+    num_attr.setUsesArrayDataBuilder(True)
+    num_attr.setReadable(True)
+    num_attr.setWritable(False)
+    num_attr.setStorable(False)
+
+    petMidpoint.out_matrices = matrix_attr.create('outMatrices', 'oms')
+    matrix_attr.setArray(True)
+    matrix_attr.setUsesArrayDataBuilder(True)
+    matrix_attr.setReadable(True)
+    matrix_attr.setWritable(False)
+    matrix_attr.setStorable(False)
+
     #--------------------
     # ADD ATTR TO NODE
     #--------------------
     petMidpoint.addAttribute(petMidpoint.in_matrix_1)
     petMidpoint.addAttribute(petMidpoint.in_matrix_2)
     petMidpoint.addAttribute(petMidpoint.out_midpoint)
+    petMidpoint.addAttribute(petMidpoint.in_matrix)
+    petMidpoint.addAttribute(petMidpoint.in_weight)
+    petMidpoint.addAttribute(petMidpoint.in_average_orientation)
+    petMidpoint.addAttribute(petMidpoint.out_centroid)
+    petMidpoint.addAttribute(petMidpoint.out_centroid_matrix)
+    petMidpoint.addAttribute(petMidpoint.in_count)
+    petMidpoint.addAttribute(petMidpoint.in_ease)
+    petMidpoint.addAttribute(petMidpoint.in_interpolate_rotation)
+    petMidpoint.addAttribute(petMidpoint.out_points)
+    petMidpoint.addAttribute(petMidpoint.out_matrices)
 
     #--------------------
     # SETUP DEPENDENCY
@@ -133,6 +420,16 @@ def nodeInitializer():
     petMidpoint.attributeAffects(petMidpoint.in_matrix_1, petMidpoint.out_midpoint)
     petMidpoint.attributeAffects(petMidpoint.in_matrix_2, petMidpoint.out_midpoint)
 
+    for in_attr in (petMidpoint.in_matrix, petMidpoint.in_weight):
+        petMidpoint.attributeAffects(in_attr, petMidpoint.out_centroid)
+        petMidpoint.attributeAffects(in_attr, petMidpoint.out_centroid_matrix)
+    petMidpoint.attributeAffects(petMidpoint.in_average_orientation, petMidpoint.out_centroid_matrix)
+
+    for in_attr in (petMidpoint.in_matrix_1, petMidpoint.in_matrix_2, petMidpoint.in_count, petMidpoint.in_ease):
+        petMidpoint.attributeAffects(in_attr, petMidpoint.out_points)
+        petMidpoint.attributeAffects(in_attr, petMidpoint.out_matrices)
+    petMidpoint.attributeAffects(petMidpoint.in_interpolate_rotation, petMidpoint.out_matrices)
+
 def initializePlugin(mobject):
     mplugin = OpenMayaMPx.MFnPlugin(mobject)
     try:
@@ -0,0 +1,346 @@
+import sys, math
+import numpy as np
+from maya import OpenMaya, OpenMayaMPx
+
+# The name of the node.
+node_name = 'petNearest'
+
+node_classify = 'utility/general'
+
+# A unique ID associated to this node type.
+# Plugs for internal use only can use 0 - 0x7ffff.
+node_id = OpenMaya.MTypeId(0x00015)
+
+
+class UniformGrid(object):
+    '''
+    A uniform grid of candidate points, about one point per cell, for nearest point queries.
+    update refits the grid when only some points move, moving just those points between cells,
+    and rebuilds it when the number of points changes or most of them move.
+    '''
+    # up to this many points, checking every point is faster than walking the cells
+    brute_force_size = 1000
+
+    def __init__(self):
+        self.positions = np.zeros((0, 3))
+        self.cell_size = 1.0
+        self.keys = np.zeros((0, 3), dtype=np.int64)
+        self.cells = {}
+        self.key_min = np.zeros(3, dtype=np.int64)
+        self.key_max = np.zeros(3, dtype=np.int64)
+
+    def cell_keys(self, positions):
+        return np.floor(positions / self.cell_size).astype(np.int64)
+
+    def rebuild(self, positions):
+        self.positions = positions.copy()
+        n = len(positions)
+        if n:
+            extent = np.sort(positions.max(axis=0) - positions.min(axis=0))[::-1]
+            # cells of about one point each. a side shorter than a cell does not add cells, so flat
+            # and straight point sets, also nearly flat ones, are sized by their longest sides only
+            self.cell_size = 1.0
+            for dims in (3, 2, 1):
+                if extent[dims - 1] > 0.0:
+                    self.cell_size = (np.prod(extent[:dims]) / n) ** (1.0 / dims)
+                    if self.cell_size <= extent[dims - 1]:
+                        break
+
+        self.keys = self.cell_keys(positions)
+        self.cells = {}
+        for i, key in enumerate(map(tuple, self.keys.tolist())):
+            self.cells.setdefault(key, []).append(i)
+        self.update_bounds()
+
+    def update_bounds(self):
+        if len(self.keys):
+            self.key_min = self.keys.min(axis=0)
+            self.key_max = self.keys.max(axis=0)
+
+    def update(self, positions):
+        ''' Fits the grid to new positions, returns the number of points that moved. '''
+        if len(positions) != len(self.positions):
+            self.rebuild(positions)
+            return len(positions)
+
+        moved = np.flatnonzero((positions != self.positions).any(axis=1))
+        if len(moved) * 2 > len(positions):
+            self.rebuild(positions)
+            return len(moved)
+
+        # refit, only the points that changed cells are moved between cell lists
+        self.positions[moved] = positions[moved]
+        new_keys = self.cell_keys(positions[moved])
+        changed = (new_keys != self.keys[moved]).any(axis=1)
+        for i, old_key, new_key in zip(moved[changed].tolist(), self.keys[moved[changed]].tolist(), new_keys[changed].tolist()):
+            old_key = tuple(old_key)
+            cell = self.cells[old_key]
+            cell.remove(i)
+            if not cell:
+                del self.cells[old_key]
+            self.cells.setdefault(tuple(new_key), []).append(i)
+        self.keys[moved] = new_keys
+        if changed.any():
+            self.update_bounds()
+        return len(moved)
+
+    def nearest(self, point):
+        '''
+        Returns the index of the point nearest to point, and its distance, -1 when there are no
+        points. The cells are searched in growing shells around the cell of the point, until the
+        next shell can not hold anything nearer. With only a few points, or when the shells would
+        walk more cells than an eighth of the points, e.g. for a point far away from all the points,
+        every point is checked instead.
+        '''
+        if not len(self.positions):
+            return -1, 0.0
+
+        point = np.asarray(point, dtype=np.float64)
+        if len(self.positions) <= self.brute_force_size:
+            return self.nearest_brute_force(point)
+
+        center = self.cell_keys(point)
+        # the cell offsets that hold points, shells only walk the part inside them
+        lo = (self.key_min - center).tolist()
+        hi = (self.key_max - center).tolist()
+        first = max(max(lo[axis], -hi[axis], 0) for axis in range(3))
+        last = max(max(-lo[axis], hi[axis]) for axis in range(3))
+
+        best_index = -1
+        best_distance = float('inf')
+        cx, cy, cz = center.tolist()
+        walked = 0
+        for r in range(first, last + 1):
+            # per axis, all the offsets of the shell inside the bounds, and its two faces inside them
+            full = [range(max(-r, lo[axis]), min(r, hi[axis]) + 1) for axis in range(3)]
+            walked += len(full[0]) * len(full[1]) * len(full[2])
+            if walked > len(self.positions) // 8:
+                break
+            faces = [[d for d in set((-r, r)) if lo[axis] <= d <= hi[axis]] for axis in range(3)]
+
+            # only the faces of the shell, the inside was searched already
+            candidates = []
+            for dx in full[0]:
+                on_x = abs(dx) == r
+                # off the x faces, a y row only reaches the shell on the y faces, or on the z faces
+                for dy in (full[1] if (on_x or faces[2]) else faces[1]):
+                    for dz in (full[2] if (on_x or abs(dy) == r) else faces[2]):
+                        cell = self.cells.get((cx + dx, cy + dy, cz + dz))
+                        if cell:
+                            candidates.extend(cell)
+
+            if candidates:
+                d = self.positions[candidates] - point
+                distances = (d*d).sum(axis=1)
+                i = int(distances.argmin())
+                if distances[i] < best_distance:
+                    best_distance = float(distances[i])
+                    best_index = candidates[i]
+
+            # anything in the next shell is at least r cells away
+            if best_index >= 0 and math.sqrt(best_distance) <= r * self.cell_size:
+                return best_index, math.sqrt(best_distance)
+
+        return self.nearest_brute_force(point)
+
+    def nearest_brute_force(self, point):
+        d = self.positions - point
+        distances = (d*d).sum(axis=1)
+        i = int(distances.argmin())
+        return i, math.sqrt(float(distances[i]))
+
+
+def top_attribute(plug):
+    ''' Returns the attribute a plug belongs to, walking up from children and elements. '''
+    while plug.isChild() or plug.isElement():
+        if plug.isChild():
+            plug = plug.parent()
+        else:
+            plug = plug.array()
+    return plug.attribute()
+
+
+class petNearest(OpenMayaMPx.MPxNode):
+
+    # define attrs. This will hold a ref to the MObj that are created in the nodeInitializer
+    in_matrix = OpenMaya.MObject()
+    in_point = OpenMaya.MObject()
+    in_query = OpenMaya.MObject()
+
+    # output, one result per query
+    out_result = OpenMaya.MObject()
+    out_nearest_index = OpenMaya.MObject()
+    out_nearest_point = OpenMaya.MObject()
+    out_nearest_distance = OpenMaya.MObject()
+
+    def __init__(self):
+        OpenMayaMPx.MPxNode.__init__(self)
+        # the index of the candidates, kept between computes and refit when they move
+        self._grid = UniformGrid()
+
+    def compute(self, plug, data_block):
+
+        if top_attribute(plug) == petNearest.out_result:
+
+            #--------------------
+            # INPUT
+            #--------------------
+            # the candidates are the translation rows of in_matrix, or in_point when no matrices are set
+            indices = []
+            positions = []
+            in_matrix_AH = data_block.inputArrayValue(petNearest.in_matrix)
+            for i in range(in_matrix_AH.elementCount()):
+                in_matrix_AH.jumpToArrayElement(i)
+                indices.append(in_matrix_AH.elementIndex())
+                in_matrix_V = in_matrix_AH.inputValue().asMatrix()
+                positions.append((in_matrix_V(3,0), in_matrix_V(3,1), in_matrix_V(3,2)))
+
+            if not indices:
+                in_point_AH = data_block.inputArrayValue(petNearest.in_point)
+                for i in range(in_point_AH.elementCount()):
+                    in_point_AH.jumpToArrayElement(i)
+                    indices.append(in_point_AH.elementIndex())
+                    in_point_V = in_point_AH.inputValue().asVector()
+                    positions.append((in_point_V.x, in_point_V.y, in_point_V.z))
+
+            query_indices = []
+            queries = []
+            in_query_AH = data_block.inputArrayValue(petNearest.in_query)
+            for i in range(in_query_AH.elementCount()):
+                in_query_AH.jumpToArrayElement(i)
+                query_indices.append(in_query_AH.elementIndex())
+                in_query_V = in_query_AH.inputValue().asVector()
+                queries.append((in_query_V.x, in_query_V.y, in_query_V.z))
+
+            #--------------------
+            # COMPUTE
+            #--------------------
+            positions = np.array(positions, dtype=np.float64).reshape(-1, 3)
+            self._grid.update(positions)
+
+            results = []
+            for query in queries:
+                nearest, distance = self._grid.nearest(query)
+                if nearest < 0:
+                    results.append((-1, query, 0.0))
+                else:
+                    results.append((indices[nearest], tuple(positions[nearest].tolist()), distance))
+
+            #--------------------
+            # OUTPUT
+            #--------------------
+            # the result of every query through one builder, at the index of its query
+            out_result_AH = data_block.outputArrayValue(petNearest.out_result)
+            builder = OpenMaya.MArrayDataBuilder(data_block, petNearest.out_result, len(results))
+            for query_index, (index, point, distance) in zip(query_indices, results):
+                element_DH = builder.addElement(query_index)
+                element_DH.child(petNearest.out_nearest_index).setInt(index)
+                element_DH.child(petNearest.out_nearest_point).set3Double(*point)
+                element_DH.child(petNearest.out_nearest_distance).setDouble(distance)
+            out_result_AH.set(builder)
+            out_result_AH.setAllClean()
+
+            # mark the plug clean
+            data_block.setClean(plug)
+
+        else:
+            return OpenMaya.kUnknownParameter
+
+
+def nodeCreator():
+    # create an instance and return a pointer MObj to it
+    return OpenMayaMPx.asMPxPtr(petNearest())
+
+def nodeInitializer():
+    matrix_attr = OpenMaya.MFnMatrixAttribute()
+    num_attr = OpenMaya.MFnNumericAttribute()
+    compound_attr = OpenMaya.MFnCompoundAttribute()
+    k3_double = OpenMaya.MFnNumericData.k3Double
+
+    #--------------------
+    # INPUT
+    #--------------------
+    # the candidates, as matrices
+    petNearest.in_matrix = matrix_attr.create('in_matrix', 'im')
+    matrix_attr.setArray(True)
+    matrix_attr.setReadable(True)
+    matrix_attr.setWritable(True)
+    matrix_attr.setStorable(True)
+
+    # or as points, used when in_matrix has no elements
+    petNearest.in_point = num_attr.create('in_point', 'ip', k3_double)
+    num_attr.setArray(True)
+    num_attr.setReadable(True)
+    num_attr.setWritable(True)
+    num_attr.setStorable(True)
+
+    # the points to find the nearest candidate of
+    petNearest.in_query = num_attr.create('query', 'q', k3_double)
+    num_attr.setArray(True)
+    num_attr.setReadable(True)
+    num_attr.setWritable(True)
+    num_attr.setStorable(True)
+    num_attr.setKeyable(True)
+
+    #--------------------
+    # OUTPUT
+    #--------------------
+    # the index of the nearest candidate, -1 without candidates
+    petNearest.out_nearest_index = num_attr.create('nearestIndex', 'ni', OpenMaya.MFnNumericData.kInt, -1)
+    num_attr.setWritable(False)
+    num_attr.setStorable(False)
+
+    petNearest.out_nearest_point = num_attr.create('nearestPoint', 'np', k3_double)
+    num_attr.setWritable(False)
+    num_attr.setStorable(False)
+
+    petNearest.out_nearest_distance = num_attr.create('nearestDistance', 'nd', OpenMaya.MFnNumericData.kDouble, 0.0)
+    num_attr.setWritable(False)
+    num_attr.setStorable(False)
+
+    petNearest.out_result = compound_attr.create('result', 'res')
+    compound_attr.addChild(petNearest.out_nearest_index)
+    compound_attr.addChild(petNearest.out_nearest_point)
+    compound_attr.addChild(petNearest.out_nearest_distance)
+    compound_attr.setArray(True)
+    compound_attr.setUsesArrayDataBuilder(True)
+    compound_attr.setWritable(False)
+    compound_attr.setStorable(False)
+
+    #--------------------
+    # ADD ATTR TO NODE
+    #--------------------
+    petNearest.addAttribute(petNearest.in_matrix)
+    petNearest.addAttribute(petNearest.in_point)
+    petNearest.addAttribute(petNearest.in_query)
+    petNearest.addAttribute(petNearest.out_result)
+
+    #--------------------
+    # SETUP DEPENDENCY
+    #--------------------
+    # which attributes needs to be updated if an attribute is changed
+    petNearest.attributeAffects(petNearest.in_matrix, petNearest.out_result)
+    petNearest.attributeAffects(petNearest.in_point, petNearest.out_result)
+    petNearest.attributeAffects(petNearest.in_query, petNearest.out_result)
+
+def initializePlugin(mobject):
+    mplugin = OpenMayaMPx.MFnPlugin(mobject)
+    try:
+        mplugin.registerNode(   node_name,
+                                node_id,
+                                nodeCreator,
+                                nodeInitializer,
+                                OpenMayaMPx.MPxNode.kDependNode,
+                                node_classify)
+    except:
+        sys.stderr.write( 'Failed to register node: ' + node_name )
+        raise
+
+
+def uninitializePlugin(mobject):
+    mplugin = OpenMayaMPx.MFnPlugin(mobject)
+    try:
+        mplugin.deregisterNode(node_id)
+    except:
+        sys.stderr.write( 'Failed to deregister node: ' + node_name )
+        raise
@@ -1,4 +1,5 @@
 import sys, math    
+import numpy as np
 from maya import OpenMaya, OpenMayaMPx
 
 # The name of the node.
@@ -13,6 +14,136 @@ kPluginNodeClassify = 'utility/general'
 # if you plan to distribute the plug, get an ID from AD  
 kPluginNodeId = OpenMaya.MTypeId(0x00002) 
 
+# The multi cylinder engine, one crank driving every cylinder.
+kEngineNodeName = 'petPistonEngine'
+kEngineNodeId = OpenMaya.MTypeId(0x00013)
+
+def slider_crank(radius, rod_length, ux, uy):
+    '''
+    Vectorized slider crank from the cos (ux) and sin (uy) of the crank angles.
+    Returns the arc_x, arc_y, rod_x and orient arrays.
+    '''
+    arc_x = ux * radius
+    arc_y = uy * radius
+
+    rod_x = radius * ux + np.sqrt(rod_length*rod_length - radius*radius * uy*uy)
+    orient = np.degrees(np.arctan(arc_y/(arc_x - rod_x)))
+
+    return arc_x, arc_y, rod_x, orient
+
+def solve_pistons(radius, rod_offset, angle):
+    '''
+    Vectorized slider crank, the same as the compute of a single piston.
+        - radius, rod_offset, angle: arrays (or floats) of crank radius, rod offset and crank angle in degrees
+    Returns the arc_x, arc_y, rod_x and orient arrays.
+    '''
+    angle = np.radians(angle)
+    return slider_crank(radius, radius*2 + rod_offset, np.cos(angle), np.sin(angle))
+
+def solve_piston(radius, rod_offset, angle):
+    '''
+    The slider crank of a single piston, with scalar math.
+        - angle: the crank angle in degrees
+    Returns arc_x, arc_y, rod_x and orient.
+    '''
+    angle_val = 0.017453292 * angle
+
+    ux = math.cos(angle_val)
+    uy = math.sin(angle_val)
+
+    arc_x = ux * radius
+    arc_y = uy * radius
+
+    rod_length = radius*2 + rod_offset
+
+    rod_x = radius * ux + math.sqrt(rod_length*rod_length - radius*radius * uy*uy)
+
+    #orient = (180/3.1415926) * math.atan(arc_y/(arc_x - rod_x))
+    orient = 57.295779513 * math.atan(arc_y/(arc_x - rod_x))
+
+    return arc_x, arc_y, rod_x, orient
+
+def solve_piston_angle(radius, rod_offset, rod_x, guess):
+    '''
+    The inverse of solve_piston, the crank angle in degrees that puts the piston at rod_x.
+    Newton iteration from guess, the angle of the last solve, so it stays on the same side of the
+    crank and the same revolution. Near the dead centers the derivative goes to zero, so a step is
+    at most a quarter radian and an iterate more than half a revolution from guess is rejected.
+    If it does not converge the closed form cos(angle) = (x*x + r*r - l*l) / (2*x*r) is used on the
+    side and revolution of guess. rod_x is clamped to the stroke.
+    '''
+    rod_length = radius*2 + rod_offset
+    rod_x = min(max(rod_x, rod_length - radius), rod_length + radius)
+
+    start = 0.017453292 * guess
+    angle = start
+    for i in range(8):
+        ux = math.cos(angle)
+        uy = math.sin(angle)
+        root = math.sqrt(rod_length*rod_length - radius*radius * uy*uy)
+        error = radius * ux + root - rod_x
+        if abs(error) < 1e-6:
+            return 57.295779513 * angle
+
+        slope = -radius * uy * (1.0 + radius * ux / root)
+        if abs(slope) < 1e-9:
+            break
+        angle -= min(max(error / slope, -0.25), 0.25)
+        if abs(angle - start) > math.pi:
+            break
+
+    cos_angle = (rod_x*rod_x + radius*radius - rod_length*rod_length) / (2.0 * rod_x * radius)
+    angle = 57.295779513 * math.acos(min(max(cos_angle, -1.0), 1.0))
+    revolution = 360.0 * math.floor(guess / 360.0 + 0.5)
+    # the two solutions are +-angle, take the one nearest the guess
+    candidates = [revolution + a for a in (angle, -angle, angle - 360.0, 360.0 - angle)]
+    return min(candidates, key=lambda a: abs(a - guess))
+
+def planar_matrix(angle, x, y):
+    ''' An MMatrix rotated angle degrees around z and translated to x, y in the plane of the piston. '''
+    angle = 0.017453292 * angle
+    c = math.cos(angle)
+    s = math.sin(angle)
+    matrix = OpenMaya.MMatrix()
+    OpenMaya.MScriptUtil.createMatrixFromList([c, s, 0.0, 0.0,
+                                               -s, c, 0.0, 0.0,
+                                               0.0, 0.0, 1.0, 0.0,
+                                               x, y, 0.0, 1.0], matrix)
+    return matrix
+
+def read_float_elements(h_array):
+    ''' Returns the logical indices and the values of a float multi. '''
+    indices = []
+    values = []
+    for i in range(h_array.elementCount()):
+        h_array.jumpToArrayElement(i)
+        indices.append(h_array.elementIndex())
+        values.append(h_array.inputValue().asFloat())
+    return indices, values
+
+def array_attribute(plug):
+    ''' Returns the attribute of the multi a plug belongs to, walking up from elements. '''
+    if plug.isElement():
+        plug = plug.array()
+    return plug.attribute()
+
+def read_float_array(h_array, indices, default):
+    ''' Reads a float multi into an array ordered by indices, missing elements get the default. '''
+    values = {}
+    for i in range(h_array.elementCount()):
+        h_array.jumpToArrayElement(i)
+        values[h_array.elementIndex()] = h_array.inputValue().asFloat()
+    return np.array([values.get(index, default) for index in indices])
+
+def write_float_array(data, attr, indices, values):
+    ''' Writes values to the elements of a float multi with the given indices through one builder. '''
+    h_array = data.outputArrayValue(attr)
+    builder = OpenMaya.MArrayDataBuilder(data, attr, len(indices))
+    for index, value in zip(indices, values):
+        builder.addElement(index).setFloat(value)
+    h_array.set(builder)
+    h_array.setAllClean()
+
 ##########################################################
 # Plug-in 
 ##########################################################
@@ -26,10 +157,31 @@ class myNode(OpenMayaMPx.MPxNode):
     arc_y = OpenMaya.MObject()
     rod_x = OpenMaya.MObject()
     orient = OpenMaya.MObject()
+
+    # array mode, one element per piston
+    radius_array = OpenMaya.MObject()
+    rod_offset_array = OpenMaya.MObject()
+    angle_array = OpenMaya.MObject()
+
+    arc_x_array = OpenMaya.MObject()
+    arc_y_array = OpenMaya.MObject()
+    rod_x_array = OpenMaya.MObject()
+    orient_array = OpenMaya.MObject()
+
+    inverse = OpenMaya.MObject()
+    target_rod_x = OpenMaya.MObject()
+    solved_angle = OpenMaya.MObject()
+
+    parent_matrix = OpenMaya.MObject()
+    crank_pin_matrix = OpenMaya.MObject()
+    rod_matrix = OpenMaya.MObject()
+    piston_matrix = OpenMaya.MObject()
     
     def __init__(self):
         ''' Constructor. '''
         OpenMayaMPx.MPxNode.__init__(self)
+        # the angle of the last inverse solve, the warm start of the next
+        self._inverse_angle = 0.0
         
     #def compute(self, pPlug, pDataBlock):
     def compute(self, plug, data):
@@ -39,7 +191,9 @@ class myNode(OpenMayaMPx.MPxNode):
             - data: Contains the data on which we will base our computations.
         '''
         
-        if(plug == myNode.arc_x or plug == myNode.arc_y or plug == myNode.rod_x or plug == myNode.orient):
+        if(plug == myNode.arc_x or plug == myNode.arc_y or plug == myNode.rod_x or plug == myNode.orient or
+           plug == myNode.solved_angle or plug == myNode.crank_pin_matrix or plug == myNode.rod_matrix or
+           plug == myNode.piston_matrix):
             
             # Obtain the data handles for each attribute
 
@@ -51,45 +205,148 @@ class myNode(OpenMayaMPx.MPxNode):
             out_arc_y = data.outputValue(myNode.arc_y)
             out_rod_x = data.outputValue(myNode.rod_x)
             out_orient = data.outputValue(myNode.orient)
+            out_solved_angle = data.outputValue(myNode.solved_angle)
             
             # Extract the actual value associated to our sample input attribute (we have defined it as a float)
 
             radius_val = radius_data.asFloat()
             rod_offset_val = rod_offset_data.asFloat()
-            #angle_val = (3.1415926/180) * angle_data.asFloat()
-            angle_val = 0.017453292 * angle_data.asFloat()
+            angle_val = angle_data.asFloat()
             
 
             # COMPUTE #############################
 
-            ux = math.cos(angle_val)
-            uy = math.sin(angle_val)
-
-            arc_x = ux * radius_val
-            arc_y = uy * radius_val
-
-            rod_length = radius_val*2 + rod_offset_val
+            # in inverse mode the angle is solved from the target rod x, warm started from the last solve
+            if data.inputValue(myNode.inverse).asBool():
+                target_rod_x_val = data.inputValue(myNode.target_rod_x).asFloat()
+                angle_val = solve_piston_angle(radius_val, rod_offset_val, target_rod_x_val, self._inverse_angle)
+                self._inverse_angle = angle_val
 
-            rod_x = radius_val * ux + math.sqrt(rod_length*rod_length - radius_val*radius_val * uy*uy)
-
-            #orient = (180/3.1415926) * math.atan(arc_y/(arc_x - rod_x))
-            orient = 57.295779513 * math.atan(arc_y/(arc_x - rod_x))
+            arc_x, arc_y, rod_x, orient = solve_piston(radius_val, rod_offset_val, angle_val)
 
             # Set the output value.
             out_arc_x.setFloat(arc_x)
             out_arc_y.setFloat(arc_y)
             out_rod_x.setFloat(rod_x)
             out_orient.setFloat(orient)
+            out_solved_angle.setFloat(angle_val)
             
             # Mark the output data handle as being clean; it need not be computed given its input.
             out_arc_x.setClean()
             out_arc_y.setClean()
             out_rod_x.setClean()
             out_orient.setClean()
+            out_solved_angle.setClean()
+
+            # the matrices are only built when one of them is asked for, the float outputs are
+            # cheap enough to set along with them
+            if plug == myNode.crank_pin_matrix or plug == myNode.rod_matrix or plug == myNode.piston_matrix:
+                parent_matrix_val = data.inputValue(myNode.parent_matrix).asMatrix()
+
+                # the crank pin turns with the crank, the rod aims from the pin at the piston
+                crank_pin = planar_matrix(angle_val, arc_x, arc_y) * parent_matrix_val
+                rod = planar_matrix(orient, arc_x, arc_y) * parent_matrix_val
+                piston = planar_matrix(0.0, rod_x, 0.0) * parent_matrix_val
+
+                for attr, matrix in ((myNode.crank_pin_matrix, crank_pin), (myNode.rod_matrix, rod), (myNode.piston_matrix, piston)):
+                    out_matrix = data.outputValue(attr)
+                    out_matrix.setMMatrix(matrix)
+                    out_matrix.setClean()
+
+        elif array_attribute(plug) in (myNode.arc_x_array, myNode.arc_y_array, myNode.rod_x_array, myNode.orient_array):
+
+            # every connected angle element is a piston, its radius and rod offset elements
+            # fall back to radius and rod offset when they are not set
+            indices, angles = read_float_elements(data.inputArrayValue(myNode.angle_array))
+
+            radius_val = data.inputValue(myNode.radius).asFloat()
+            rod_offset_val = data.inputValue(myNode.rod_offset).asFloat()
+            radii = read_float_array(data.inputArrayValue(myNode.radius_array), indices, radius_val)
+            rod_offsets = read_float_array(data.inputArrayValue(myNode.rod_offset_array), indices, rod_offset_val)
+
+            # COMPUTE #############################
+
+            arc_x, arc_y, rod_x, orient = solve_pistons(radii, rod_offsets, np.array(angles))
+
+            # Set all the output arrays, and mark them clean.
+            write_float_array(data, myNode.arc_x_array, indices, arc_x)
+            write_float_array(data, myNode.arc_y_array, indices, arc_y)
+            write_float_array(data, myNode.rod_x_array, indices, rod_x)
+            write_float_array(data, myNode.orient_array, indices, orient)
+            data.setClean(plug)
              
         else:
             return OpenMaya.kUnknownParameter
 
+
+class petPistonEngine(OpenMayaMPx.MPxNode):
+    '''
+    Every cylinder of an engine driven by one crank angle. Each connected phaseOffset element is a
+    cylinder, with its own bank angle (the rotation of the cylinder axis around the crank) and rod
+    length. The outputs are in the frame of each cylinder, like the outputs of a petPiston.
+    '''
+    crank_angle = OpenMaya.MObject()
+    radius = OpenMaya.MObject()
+    rod_length = OpenMaya.MObject()
+    phase_offset = OpenMaya.MObject()
+    bank_angle = OpenMaya.MObject()
+    rod_length_array = OpenMaya.MObject()
+
+    arc_x = OpenMaya.MObject()
+    arc_y = OpenMaya.MObject()
+    rod_x = OpenMaya.MObject()
+    orient = OpenMaya.MObject()
+
+    def __init__(self):
+        ''' Constructor. '''
+        OpenMayaMPx.MPxNode.__init__(self)
+        # the cos and sin of the cylinder offsets, kept until the phase or bank angles change
+        self._offsets = None
+        self._offset_trig = None
+
+    def offset_trig(self, offsets):
+        ''' Returns the cos and sin of the cylinder angle offsets, only recomputed when they change. '''
+        if self._offsets is None or not np.array_equal(self._offsets, offsets):
+            self._offsets = offsets
+            self._offset_trig = (np.cos(offsets), np.sin(offsets))
+        return self._offset_trig
+
+    def compute(self, plug, data):
+        '''
+        Node computation method.
+            - plug: A connection point related to one of our node attributes (could be an input or an output)
+            - data: Contains the data on which we will base our computations.
+        '''
+        if array_attribute(plug) not in (petPistonEngine.arc_x, petPistonEngine.arc_y, petPistonEngine.rod_x, petPistonEngine.orient):
+            return OpenMaya.kUnknownParameter
+
+        crank_angle_val = 0.017453292 * data.inputValue(petPistonEngine.crank_angle).asFloat()
+        radius_val = data.inputValue(petPistonEngine.radius).asFloat()
+        rod_length_val = data.inputValue(petPistonEngine.rod_length).asFloat()
+
+        indices, phases = read_float_elements(data.inputArrayValue(petPistonEngine.phase_offset))
+        banks = read_float_array(data.inputArrayValue(petPistonEngine.bank_angle), indices, 0.0)
+        rod_lengths = read_float_array(data.inputArrayValue(petPistonEngine.rod_length_array), indices, rod_length_val)
+
+        # COMPUTE #############################
+
+        # the crank angle in the frame of a cylinder is crank + phase - bank. The crank trig is
+        # shared by all cylinders and the angle sum expanded, so a frame costs one cos and sin.
+        cos_offset, sin_offset = self.offset_trig(np.radians(np.array(phases) - banks))
+        cos_crank = math.cos(crank_angle_val)
+        sin_crank = math.sin(crank_angle_val)
+        ux = cos_crank * cos_offset - sin_crank * sin_offset
+        uy = sin_crank * cos_offset + cos_crank * sin_offset
+
+        arc_x, arc_y, rod_x, orient = slider_crank(radius_val, rod_lengths, ux, uy)
+
+        # Set all the output arrays, and mark them clean.
+        write_float_array(data, petPistonEngine.arc_x, indices, arc_x)
+        write_float_array(data, petPistonEngine.arc_y, indices, arc_y)
+        write_float_array(data, petPistonEngine.rod_x, indices, rod_x)
+        write_float_array(data, petPistonEngine.orient, indices, orient)
+        data.setClean(plug)
+
 ##########################################################
 # Plug-in initialization.
 ##########################################################
@@ -129,6 +386,18 @@ def nodeInitializer():
     nAttr.setStorable(True) 
     nAttr.setHidden(False)
     myNode.addAttribute(myNode.angle)
+
+    # inverse mode, solve the angle that puts the piston at targetRodx
+    myNode.inverse = nAttr.create('inverse', 'inv', OpenMaya.MFnNumericData.kBoolean, False)
+    nAttr.setWritable(True)
+    nAttr.setStorable(True)
+    myNode.addAttribute(myNode.inverse)
+
+    myNode.target_rod_x = nAttr.create('targetRodx', 'trx', kFloat, 32.0)
+    nAttr.setWritable(True)
+    nAttr.setStorable(True)
+    nAttr.setKeyable(True)
+    myNode.addAttribute(myNode.target_rod_x)
     
     #==================================
     # OUTPUT NODE ATTRIBUTE(S)
@@ -161,6 +430,88 @@ def nodeInitializer():
     nAttr.setReadable(True)
     nAttr.setHidden(False)
     myNode.addAttribute(myNode.orient)
+
+    # the angle used, the input angle or the inverse solve
+    myNode.solved_angle = nAttr.create('solvedAngle', 'sa', kFloat)
+    nAttr.setStorable(False)
+    nAttr.setWritable(False)
+    nAttr.setReadable(True)
+    myNode.addAttribute(myNode.solved_angle)
+
+    # world matrices, the crank center sits at the parent matrix and the piston moves along its x axis
+    mAttr = OpenMaya.MFnMatrixAttribute()
+
+    myNode.parent_matrix = mAttr.create('parentMatrix', 'pm')
+    mAttr.setWritable(True)
+    mAttr.setStorable(True)
+    myNode.addAttribute(myNode.parent_matrix)
+
+    myNode.crank_pin_matrix = mAttr.create('crankPinMatrix', 'cpm')
+    mAttr.setStorable(False)
+    mAttr.setWritable(False)
+    myNode.addAttribute(myNode.crank_pin_matrix)
+
+    myNode.rod_matrix = mAttr.create('rodMatrix', 'rm')
+    mAttr.setStorable(False)
+    mAttr.setWritable(False)
+    myNode.addAttribute(myNode.rod_matrix)
+
+    myNode.piston_matrix = mAttr.create('pistonMatrix', 'psm')
+    mAttr.setStorable(False)
+    mAttr.setWritable(False)
+    myNode.addAttribute(myNode.piston_matrix)
+
+    #==================================
+    # ARRAY MODE ATTRIBUTE(S)
+    #==================================
+    # every connected angleArray element is a piston, solved together in one compute.
+    # radiusArray and rodOffsetArray elements that are not set use radius and rodOffset
+
+    myNode.radius_array = nAttr.create('radiusArray', 'ra', kFloat, 10.0)
+    nAttr.setArray(True)
+    nAttr.setWritable(True)
+    nAttr.setStorable(True)
+    myNode.addAttribute(myNode.radius_array)
+
+    myNode.rod_offset_array = nAttr.create('rodOffsetArray', 'roa', kFloat, 2.0)
+    nAttr.setArray(True)
+    nAttr.setWritable(True)
+    nAttr.setStorable(True)
+    myNode.addAttribute(myNode.rod_offset_array)
+
+    myNode.angle_array = nAttr.create('angleArray', 'aa', kFloat, 0.0)
+    nAttr.setArray(True)
+    nAttr.setWritable(True)
+    nAttr.setStorable(True)
+    myNode.addAttribute(myNode.angle_array)
+
+    myNode.arc_x_array = nAttr.create('arcxArray', 'axa', kFloat)
+    nAttr.setArray(True)
+    nAttr.setUsesArrayDataBuilder(True)
+    nAttr.setStorable(False)
+    nAttr.setWritable(False)
+    myNode.addAttribute(myNode.arc_x_array)
+
+    myNode.arc_y_array = nAttr.create('arcyArray', 'aya', kFloat)
+    nAttr.setArray(True)
+    nAttr.setUsesArrayDataBuilder(True)
+    nAttr.setStorable(False)
+    nAttr.setWritable(False)
+    myNode.addAttribute(myNode.arc_y_array)
+
+    myNode.rod_x_array = nAttr.create('rodxArray', 'rxa', kFloat)
+    nAttr.setArray(True)
+    nAttr.setUsesArrayDataBuilder(True)
+    nAttr.setStorable(False)
+    nAttr.setWritable(False)
+    myNode.addAttribute(myNode.rod_x_array)
+
+    myNode.orient_array = nAttr.create('orientArray', 'oa', kFloat)
+    nAttr.setArray(True)
+    nAttr.setUsesArrayDataBuilder(True)
+    nAttr.setStorable(False)
+    nAttr.setWritable(False)
+    myNode.addAttribute(myNode.orient_array)
     
     #==================================
     # NODE ATTRIBUTE DEPENDENCIES
@@ -179,6 +530,113 @@ def nodeInitializer():
     myNode.attributeAffects(myNode.rod_offset, myNode.rod_x)
     myNode.attributeAffects(myNode.rod_offset, myNode.orient)
 
+    for in_attr in (myNode.inverse, myNode.target_rod_x):
+        for out_attr in (myNode.arc_x, myNode.arc_y, myNode.rod_x, myNode.orient):
+            myNode.attributeAffects(in_attr, out_attr)
+
+    for in_attr in (myNode.angle, myNode.radius, myNode.rod_offset, myNode.inverse, myNode.target_rod_x):
+        myNode.attributeAffects(in_attr, myNode.solved_angle)
+
+    for in_attr in (myNode.angle, myNode.radius, myNode.rod_offset, myNode.inverse, myNode.target_rod_x,
+                    myNode.parent_matrix):
+        for out_attr in (myNode.crank_pin_matrix, myNode.rod_matrix, myNode.piston_matrix):
+            myNode.attributeAffects(in_attr, out_attr)
+
+    for in_attr in (myNode.radius_array, myNode.rod_offset_array, myNode.angle_array, myNode.radius, myNode.rod_offset):
+        for out_attr in (myNode.arc_x_array, myNode.arc_y_array, myNode.rod_x_array, myNode.orient_array):
+            myNode.attributeAffects(in_attr, out_attr)
+
+def engineCreator():
+    ''' Creates an instance of the engine node. '''
+    return OpenMayaMPx.asMPxPtr(petPistonEngine())
+
+def engineInitializer():
+    ''' Defines the attributes of the engine node. '''
+    nAttr = OpenMaya.MFnNumericAttribute()
+    kFloat = OpenMaya.MFnNumericData.kFloat
+
+    #==================================
+    # INPUT NODE ATTRIBUTE(S)
+    #==================================
+
+    # crank angle, shared by all cylinders
+    petPistonEngine.crank_angle = nAttr.create('crankAngle', 'ca', kFloat, 0.0)
+    nAttr.setWritable(True)
+    nAttr.setStorable(True)
+    nAttr.setKeyable(True)
+    petPistonEngine.addAttribute(petPistonEngine.crank_angle)
+
+    # crank radius
+    petPistonEngine.radius = nAttr.create('radius', 'r', kFloat, 10.0)
+    nAttr.setWritable(True)
+    nAttr.setStorable(True)
+    petPistonEngine.addAttribute(petPistonEngine.radius)
+
+    # rod length of cylinders without a rodLengthArray element
+    petPistonEngine.rod_length = nAttr.create('rodLength', 'rl', kFloat, 22.0)
+    nAttr.setWritable(True)
+    nAttr.setStorable(True)
+    petPistonEngine.addAttribute(petPistonEngine.rod_length)
+
+    # per cylinder, every phaseOffset element is a cylinder
+    petPistonEngine.phase_offset = nAttr.create('phaseOffset', 'po', kFloat, 0.0)
+    nAttr.setArray(True)
+    nAttr.setWritable(True)
+    nAttr.setStorable(True)
+    petPistonEngine.addAttribute(petPistonEngine.phase_offset)
+
+    petPistonEngine.bank_angle = nAttr.create('bankAngle', 'ba', kFloat, 0.0)
+    nAttr.setArray(True)
+    nAttr.setWritable(True)
+    nAttr.setStorable(True)
+    petPistonEngine.addAttribute(petPistonEngine.bank_angle)
+
+    petPistonEngine.rod_length_array = nAttr.create('rodLengthArray', 'rla', kFloat, 22.0)
+    nAttr.setArray(True)
+    nAttr.setWritable(True)
+    nAttr.setStorable(True)
+    petPistonEngine.addAttribute(petPistonEngine.rod_length_array)
+
+    #==================================
+    # OUTPUT NODE ATTRIBUTE(S)
+    #==================================
+
+    petPistonEngine.arc_x = nAttr.create('arcx', 'ax', kFloat)
+    nAttr.setArray(True)
+    nAttr.setUsesArrayDataBuilder(True)
+    nAttr.setStorable(False)
+    nAttr.setWritable(False)
+    petPistonEngine.addAttribute(petPistonEngine.arc_x)
+
+    petPistonEngine.arc_y = nAttr.create('arcy', 'ay', kFloat)
+    nAttr.setArray(True)
+    nAttr.setUsesArrayDataBuilder(True)
+    nAttr.setStorable(False)
+    nAttr.setWritable(False)
+    petPistonEngine.addAttribute(petPistonEngine.arc_y)
+
+    petPistonEngine.rod_x = nAttr.create('rodx', 'rx', kFloat)
+    nAttr.setArray(True)
+    nAttr.setUsesArrayDataBuilder(True)
+    nAttr.setStorable(False)
+    nAttr.setWritable(False)
+    petPistonEngine.addAttribute(petPistonEngine.rod_x)
+
+    petPistonEngine.orient = nAttr.create('orient', 'o', kFloat)
+    nAttr.setArray(True)
+    nAttr.setUsesArrayDataBuilder(True)
+    nAttr.setStorable(False)
+    nAttr.setWritable(False)
+    petPistonEngine.addAttribute(petPistonEngine.orient)
+
+    #==================================
+    # NODE ATTRIBUTE DEPENDENCIES
+    #==================================
+    for in_attr in (petPistonEngine.crank_angle, petPistonEngine.radius, petPistonEngine.rod_length,
+                    petPistonEngine.phase_offset, petPistonEngine.bank_angle, petPistonEngine.rod_length_array):
+        for out_attr in (petPistonEngine.arc_x, petPistonEngine.arc_y, petPistonEngine.rod_x, petPistonEngine.orient):
+            petPistonEngine.attributeAffects(in_attr, out_attr)
+
     
 def initializePlugin( mobject ):
     ''' Initialize the plug-in '''
@@ -189,6 +647,13 @@ def initializePlugin( mobject ):
     except:
         sys.stderr.write( 'Failed to register node: ' + kPluginNodeName )
         raise
+
+    try:
+        mplugin.registerNode( kEngineNodeName, kEngineNodeId, engineCreator,
+                              engineInitializer, OpenMayaMPx.MPxNode.kDependNode, kPluginNodeClassify )
+    except:
+        sys.stderr.write( 'Failed to register node: ' + kEngineNodeName )
+        raise
     
 def uninitializePlugin( mobject ):
     ''' Uninitializes the plug-in '''
@@ -199,6 +664,12 @@ def uninitializePlugin( mobject ):
         sys.stderr.write( 'Failed to deregister node: ' + kPluginNodeName )
         raise
 
+    try:
+        mplugin.deregisterNode( kEngineNodeId )
+    except:
+        sys.stderr.write( 'Failed to deregister node: ' + kEngineNodeName )
+        raise
+
 ##########################################################
 # Sample usage.
 ##########################################################
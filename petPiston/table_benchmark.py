@@ -0,0 +1,83 @@
+'''
+Compares a lookup table over one revolution against the exact slider crank of petPiston, speed
+and error. petPiston has no table mode, this is the measurement behind that, so it can be run
+again on another machine or Python before adding one.
+Run it with mayapy, since the plug-in module imports maya:
+
+mayapy table_benchmark.py
+'''
+import os, sys, timeit
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'release'))
+import petPiston
+
+
+class PistonTable(object):
+    '''
+    The slider crank of one radius and rod offset, sampled over a revolution and evaluated by
+    linear interpolation.
+
+    The error of linear interpolation is at most h*h/8 * max|f''|, with h = 2*pi/size the sample
+    spacing in radians. For arc_x and arc_y max|f''| is the radius, so their error is at most
+    radius * (2*pi/size)**2 / 8. rod_x and orient (in degrees) curve a little more.
+    '''
+    def __init__(self, radius, rod_offset, size):
+        self.size = size
+        self.scale = size / 360.0
+        values = np.array(petPiston.solve_pistons(radius, rod_offset, np.linspace(0.0, 360.0, size + 1))).T
+        # per interval, the start value and the slope to the next sample
+        self.values = np.ascontiguousarray(values[:-1])
+        self.slopes = np.ascontiguousarray(np.diff(values, axis=0))
+        # the scalar lookup reads python floats, numpy scalars are slower to unpack
+        self.rows = np.hstack((self.values, self.slopes)).tolist()
+
+    def lookup(self, angle):
+        ''' Returns arc_x, arc_y, rod_x and orient of one angle in degrees. '''
+        t = (angle * self.scale) % self.size
+        i = int(t)
+        f = t - i
+        a0, a1, a2, a3, d0, d1, d2, d3 = self.rows[i]
+        return a0 + d0*f, a1 + d1*f, a2 + d2*f, a3 + d3*f
+
+    def lookup_array(self, angles):
+        ''' Returns the arc_x, arc_y, rod_x and orient arrays of an array of angles in degrees. '''
+        t = np.asarray(angles, dtype=np.float64) * self.scale
+        t %= self.size
+        i = t.astype(np.intp)
+        t -= i
+        return (self.values[i] + self.slopes[i] * t[:, None]).T
+
+
+radius = 10.0
+rod_offset = 2.0
+pistons = 500
+angles = np.random.uniform(0.0, 360.0, pistons)
+angle_list = angles.tolist()
+
+for size in (256, 1024, 4096):
+    table = PistonTable(radius, rod_offset, size)
+
+    # error over a dense sample of the revolution
+    check = np.linspace(0.0, 360.0, 100003)
+    error = np.abs(table.lookup_array(check) - np.array(petPiston.solve_pistons(radius, rod_offset, check))).max(axis=1)
+    bound = radius * (2*np.pi/size)**2 / 8
+    print('table size %d, max error arcx %.2e arcy %.2e rodx %.2e orient %.2e (arcx/arcy bound %.2e)' %
+          ((size,) + tuple(error) + (bound,)))
+
+    build = timeit.timeit(lambda: PistonTable(radius, rod_offset, size), number=20) / 20
+    memory = table.values.nbytes + table.slopes.nbytes + sys.getsizeof(table.rows) + \
+        sum(sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row) for row in table.rows)
+    print('  build %.1f us, %d KB' % (build * 1e6, memory // 1024))
+
+repeat = 50
+table = PistonTable(radius, rod_offset, 1024)
+
+exact = timeit.timeit(lambda: [petPiston.solve_piston(radius, rod_offset, a) for a in angle_list], number=repeat)
+lookup = timeit.timeit(lambda: [table.lookup(a) for a in angle_list], number=repeat)
+print('scalar, per piston: exact %.3f us, table %.3f us' %
+      (exact / repeat / pistons * 1e6, lookup / repeat / pistons * 1e6))
+
+exact = timeit.timeit(lambda: petPiston.solve_pistons(radius, rod_offset, angles), number=repeat)
+lookup = timeit.timeit(lambda: table.lookup_array(angles), number=repeat)
+print('array of %d: exact %.1f us, table %.1f us' % (pistons, exact / repeat * 1e6, lookup / repeat * 1e6))
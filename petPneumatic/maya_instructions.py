@@ -0,0 +1,28 @@
+import maya.cmds as cmds
+import pymel.core as pm
+
+# delete all nodes, and flush undo to safely unload the plugin
+pm.delete([node for node in pm.ls() if isinstance(node, pm.nodetypes.petPneumatic)])
+pm.flushUndo()
+
+cmds.unloadPlugin('petPneumatic.py', force=True)
+cmds.loadPlugin('petPneumatic.py')
+
+# the cylinder ends follow the controls live, no script run per frame
+top_ctrl = cmds.circle(name='top_ctrl')[0]
+btm_ctrl = cmds.circle(name='btm_ctrl')[0]
+cmds.setAttr(top_ctrl + '.translateY', 5)
+top_cube = cmds.polyCube(name='top_cube')[0]
+btm_cube = cmds.polyCube(name='btm_cube')[0]
+
+node = cmds.createNode('petPneumatic')
+cmds.connectAttr(top_ctrl + '.worldMatrix[0]', node + '.in_matrix_1')
+cmds.connectAttr(btm_ctrl + '.worldMatrix[0]', node + '.in_matrix_2')
+
+# the node has one rotate order for both ends
+cmds.connectAttr(top_cube + '.rotateOrder', node + '.rotateOrder')
+cmds.connectAttr(top_cube + '.rotateOrder', btm_cube + '.rotateOrder')
+
+for cube, prefix in ((top_cube, 'top'), (btm_cube, 'btm')):
+    cmds.connectAttr('{0}.{1}Pos'.format(node, prefix), cube + '.translate')
+    cmds.connectAttr('{0}.{1}Rot'.format(node, prefix), cube + '.rotate')
@@ -1,3 +1,9 @@
+'''
+Reference for the cylinder aim frames, kept on purpose. petPneumatic builds these frames itself
+(aim_matrix in release/petPneumatic.py, the topMatrix, btmMatrix, topRot and btmRot outputs), so
+rigs should connect the node instead of running position_nodes. position_nodes crosses aim ^ up,
+which mirrors the frame, the node uses up ^ aim and gives the same x and y axes.
+'''
 import maya.api.OpenMaya as om
 import pymel.core as pm
 
@@ -0,0 +1,130 @@
+'''
+Bakes the top and bottom of pneumatic cylinders over a frame range, aimed like position_nodes in
+open_maya_matrix_test.py on every frame. The x and y axes are the same, z is up ^ aim instead of
+aim ^ up, so the frames are right handed like the ones of the petPneumatic node. position_nodes
+builds a mirrored frame, which no euler rotation reproduces.
+
+The world matrices of all controls are pulled in one pass over the frame range with a DG context
+per frame, the aim frames and euler angles of every frame are solved in one vectorized batch with
+the functions of the petPneumatic plug-in, and each channel is written with one addKeys call,
+with undo recording off. Like the euler filter of the graph editor, the angles of every frame
+are made continuous with the frame before, so the keys do not flip by 180 or 360 degrees.
+
+Run it in Maya:
+
+import pneumatic_bake
+pneumatic_bake.bake([('nurbsCircle1', 'nurbsCircle2', 'pCube1', 'pCube2')], 1, 2000)
+'''
+import os, sys
+import numpy as np
+import maya.cmds as cmds
+import maya.api.OpenMaya as om
+import maya.api.OpenMayaAnim as oma
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'release'))
+from petPneumatic import aim_frames, euler_from_frames, kRotateOrderAxes
+
+kTranslateAttrs = ['translateX', 'translateY', 'translateZ']
+kRotateAttrs = ['rotateX', 'rotateY', 'rotateZ']
+
+def depend_node(name):
+    sel = om.MSelectionList()
+    sel.add(name)
+    return sel.getDependNode(0)
+
+def sample_world_matrices(names, frames):
+    '''
+    Returns the world matrices of the nodes at every frame, a (nodes, frames, 4, 4) array.
+    The frame is the outer loop, so the DG evaluates each frame once for all nodes.
+    '''
+    plugs = [om.MFnDependencyNode(depend_node(name)).findPlug('worldMatrix', False).elementByLogicalIndex(0)
+             for name in names]
+
+    unit = om.MTime.uiUnit()
+    matrices = np.empty((len(names), len(frames), 16))
+    for f, frame in enumerate(frames):
+        context = om.MDGContext(om.MTime(frame, unit))
+        for n, plug in enumerate(plugs):
+            matrices[n, f] = list(om.MFnMatrixData(plug.asMObject(context)).matrix())
+    return matrices.reshape(len(names), len(frames), 4, 4)
+
+def euler_filter(angles, rotate_order):
+    '''
+    Returns (frames, 3) euler angles in radians made continuous over the frames. Every frame takes
+    the one of its two equivalent angle sets, (a, b, c) and (a + pi, pi - b, c + pi) in rotate
+    order, shifted by whole turns, that is nearest the angles of the frame before.
+    '''
+    i, j, k = kRotateOrderAxes[rotate_order]
+    flipped = angles.copy()
+    flipped[:, i] += np.pi
+    flipped[:, j] = np.pi - flipped[:, j]
+    flipped[:, k] += np.pi
+
+    filtered = angles.copy()
+    for f in range(1, len(angles)):
+        prev = filtered[f - 1]
+        candidates = np.array((angles[f], flipped[f]))
+        candidates += 2.0 * np.pi * np.round((prev - candidates) / (2.0 * np.pi))
+        filtered[f] = candidates[np.abs(candidates - prev).sum(axis=1).argmin()]
+    return filtered
+
+def anim_curve(node, attr):
+    ''' Returns the anim curve driving a plug, it is created if the plug is not keyed. '''
+    plug = om.MFnDependencyNode(node).findPlug(attr, False)
+    curve_fn = oma.MFnAnimCurve()
+    if plug.isDestination:
+        source = plug.source().node()
+        if not source.hasFn(om.MFn.kAnimCurve):
+            raise RuntimeError('{0}.{1} is connected to a node that is not an anim curve'.format(
+                om.MFnDependencyNode(node).name(), attr))
+        curve_fn.setObject(source)
+    else:
+        curve_fn.create(plug)
+    return curve_fn
+
+def key_channels(name, attrs, times, values):
+    ''' Keys every attr of a node with one addKeys call, values is a (frames, len(attrs)) array. '''
+    node = depend_node(name)
+    for i, attr in enumerate(attrs):
+        curve_fn = anim_curve(node, attr)
+        curve_fn.addKeys(times, values[:, i].tolist(), oma.MFnAnimCurve.kTangentLinear,
+                         oma.MFnAnimCurve.kTangentLinear, False)
+
+def bake(cylinders, start, end, step=1):
+    '''
+    Bakes cylinders, a list of (top control, bottom control, top object, bottom object) names,
+    from start to end. The rotations are keyed in the rotate order of each object. Like
+    position_nodes, the objects are keyed with world space values, so they should not be parented.
+    '''
+    frames = np.arange(start, end + step * 0.5, step, dtype=np.float64)
+    controls = [name for cylinder in cylinders for name in cylinder[:2]]
+
+    undo_state = cmds.undoInfo(query=True, state=True)
+    cmds.undoInfo(stateWithoutFlush=False)
+    cmds.refresh(suspend=True)
+    try:
+        matrices = sample_world_matrices(controls, frames)
+
+        unit = om.MTime.uiUnit()
+        times = om.MTimeArray([om.MTime(frame, unit) for frame in frames])
+
+        for i, (top_ctrl, btm_ctrl, top_obj, btm_obj) in enumerate(cylinders):
+            m_top = matrices[2*i]
+            m_btm = matrices[2*i + 1]
+
+            # use x axis as up, both ends aim from the bottom to the top
+            top_pos = m_top[:, 3, :3]
+            btm_pos = m_btm[:, 3, :3]
+            aim_v = top_pos - btm_pos
+
+            for obj, pos, rot_frames in ((top_obj, top_pos, aim_frames(aim_v, m_top[:, 0, :3])),
+                                         (btm_obj, btm_pos, aim_frames(aim_v, m_btm[:, 0, :3]))):
+                rotate_order = cmds.getAttr(obj + '.rotateOrder')
+                rot = euler_filter(euler_from_frames(rot_frames, rotate_order), rotate_order)
+                key_channels(obj, kTranslateAttrs, times, pos)
+                key_channels(obj, kRotateAttrs, times, rot)
+    finally:
+        cmds.refresh(suspend=False)
+        cmds.undoInfo(stateWithoutFlush=undo_state)
+
+    return len(frames)
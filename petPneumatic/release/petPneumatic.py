@@ -1,4 +1,5 @@
 import sys, math
+import numpy as np
 from maya import OpenMaya, OpenMayaMPx
 
 # The name of the node.
@@ -10,15 +11,111 @@ node_classify = 'utility/general'
 # Plugs for internal use only can use 0 - 0x7ffff.
 node_id = OpenMaya.MTypeId(0x00008)
 
+# the order of the rotateOrder enum, the same as the rotateOrder of a transform
+kRotateOrders = [OpenMaya.MEulerRotation.kXYZ,
+                OpenMaya.MEulerRotation.kYZX,
+                OpenMaya.MEulerRotation.kZXY,
+                OpenMaya.MEulerRotation.kXZY,
+                OpenMaya.MEulerRotation.kYXZ,
+                OpenMaya.MEulerRotation.kZYX]
+
+# the first, second and third axis of every rotate order in kRotateOrders
+kRotateOrderAxes = [(0, 1, 2), (1, 2, 0), (2, 0, 1), (0, 2, 1), (1, 0, 2), (2, 1, 0)]
+
+def aim_matrix(matrix, aim_v, position):
+    '''
+    The matrix of one end of a cylinder, y aims along aim_v and x is the x axis of matrix
+    made orthogonal to it, like position_nodes in open_maya_matrix_test.py. z is up ^ aim where
+    position_nodes uses aim ^ up, which mirrors the frame.
+    '''
+    # use x axis as up
+    up_vn = OpenMaya.MVector(matrix(0,0), matrix(0,1), matrix(0,2)).normal()
+
+    # up ^ aim, so x, y and z stay a right handed frame
+    aim_vn = aim_v.normal()
+    cross_vn = (up_vn ^ aim_vn).normal()
+    up_ortho_vn = aim_vn ^ cross_vn
+
+    m = OpenMaya.MMatrix()
+    m_list = [up_ortho_vn.x, up_ortho_vn.y, up_ortho_vn.z, 0,
+              aim_vn.x, aim_vn.y, aim_vn.z, 0,
+              cross_vn.x, cross_vn.y, cross_vn.z, 0,
+              position.x, position.y, position.z, 1]
+    OpenMaya.MScriptUtil.createMatrixFromList(m_list, m)
+    return m
+
+def normalized(v):
+    ''' Normalizes an (n, 3) array of vectors, zero vectors stay zero. '''
+    length = np.sqrt((v*v).sum(axis=1))
+    length[length == 0.0] = 1.0
+    return v / length[:, None]
+
+def aim_frames(aim_v, up_v):
+    '''
+    The (n, 3, 3) rotations of aim_matrix for (n, 3) arrays of aim and up vectors, rows are
+    x (the up made orthogonal), y (the aim) and z (the cross).
+    '''
+    aim_vn = normalized(aim_v)
+    cross_vn = normalized(np.cross(normalized(up_v), aim_vn))
+    up_ortho_vn = np.cross(aim_vn, cross_vn)
+    return np.stack((up_ortho_vn, aim_vn, cross_vn), axis=1)
+
+def euler_from_frames(frames, rotate_order):
+    '''
+    The (n, 3) x, y, z euler angles in radians of (n, 3, 3) row vector rotations, for an index
+    into kRotateOrders.
+    '''
+    i, j, k = kRotateOrderAxes[rotate_order]
+    parity = 1.0 if (j - i) % 3 == 1 else -1.0
+    # r(a, b) of the column vector rotation is the [b, a] of the maya row vector matrix
+    r = lambda a, b: frames[:, b, a]
+    sin_j = np.clip(-parity * r(k, i), -1.0, 1.0)
+    angles = np.empty((len(frames), 3))
+    angles[:, j] = np.arcsin(sin_j)
+    angles[:, i] = np.arctan2(parity * r(k, j), r(k, k))
+    angles[:, k] = np.arctan2(parity * r(j, i), r(i, i))
+    # gimbal lock, the first and third axes line up and only their sum is defined
+    lock = np.abs(sin_j) > 1.0 - 1e-9
+    angles[lock, k] = 0.0
+    angles[lock, i] = np.arctan2(-parity * r(j, k)[lock], r(j, j)[lock])
+    return angles
+
+def read_matrix_rows(h_array):
+    ''' Returns the logical indices, and the x axis and translation rows of the matrices of a matrix multi. '''
+    indices = []
+    rows = []
+    for i in range(h_array.elementCount()):
+        h_array.jumpToArrayElement(i)
+        indices.append(h_array.elementIndex())
+        m = h_array.inputValue().asMatrix()
+        rows.append((m(0,0), m(0,1), m(0,2), m(3,0), m(3,1), m(3,2)))
+    return indices, np.array(rows, dtype=np.float64).reshape(-1, 6)
+
 class petPneumatic(OpenMayaMPx.MPxNode):
 
     # define attrs. This will hold a ref to the MObj that are created in the nodeInitializer
     in_matrix_1 = OpenMaya.MObject()
     in_matrix_2 = OpenMaya.MObject()
+    in_rotate_order = OpenMaya.MObject()
 
     # output
     out_top_pos = OpenMaya.MObject()
     out_btm_pos = OpenMaya.MObject()
+    out_top_rot = OpenMaya.MObject()
+    out_btm_rot = OpenMaya.MObject()
+    out_top_matrix = OpenMaya.MObject()
+    out_btm_matrix = OpenMaya.MObject()
+
+    # array mode, one cylinder per pair of in_matrix_1_array and in_matrix_2_array elements
+    in_matrix_1_array = OpenMaya.MObject()
+    in_matrix_2_array = OpenMaya.MObject()
+    out_cylinder = OpenMaya.MObject()
+    out_cylinder_top_pos = OpenMaya.MObject()
+    out_cylinder_btm_pos = OpenMaya.MObject()
+    out_cylinder_top_rot = OpenMaya.MObject()
+    out_cylinder_btm_rot = OpenMaya.MObject()
+    out_cylinder_top_matrix = OpenMaya.MObject()
+    out_cylinder_btm_matrix = OpenMaya.MObject()
 
     def __init__(self):
         OpenMayaMPx.MPxNode.__init__(self)
@@ -27,7 +124,15 @@ class petPneumatic(OpenMayaMPx.MPxNode):
 
         # only output plugs will be passed to the compute method
         # we could do different computes for different plugs
-        if plug == petPneumatic.out_top_pos or plug == petPneumatic.out_btm_pos:
+        # children and elements come in on their own, compute the whole attribute for them
+        while plug.isChild() or plug.isElement():
+            if plug.isChild():
+                plug = plug.parent()
+            else:
+                plug = plug.array()
+
+        if plug in (petPneumatic.out_top_pos, petPneumatic.out_btm_pos, petPneumatic.out_top_rot, petPneumatic.out_btm_rot,
+                    petPneumatic.out_top_matrix, petPneumatic.out_btm_matrix):
 
             #--------------------
             # INPUT
@@ -45,37 +150,16 @@ class petPneumatic(OpenMayaMPx.MPxNode):
 
             t_1 = OpenMaya.MVector(in_matrix_1_V(3,0), in_matrix_1_V(3,1), in_matrix_1_V(3,2))
             t_2 = OpenMaya.MVector(in_matrix_2_V(3,0), in_matrix_2_V(3,1), in_matrix_2_V(3,2))
-            '''
-            aim_v = t_2 - t_1
-            mid_t = aim_v*.5 + t_1
-
-            aim_vn = aim_v.normal()
-
-            up_vn = OpenMaya.MVector(in_matrix_1_V(0,0), in_matrix_1_V(0,1), in_matrix_1_V(0,2)).normal()
-            cross_vn = aim_vn ^ up_vn
-            up_ortho_vn = cross_vn ^ aim_vn
-
-            #tm = OpenMaya.MTransformationMatrix([[aim_vn[0], aim_vn[1], aim_vn[2], 0], [cross_vn[0],cross_vn[1],cross_vn[2],0], [up_ortho_vn[0],up_ortho_vn[1],up_ortho_vn[2],0], [mid_t[0], mid_t[1], mid_t[2], 1]])
-            m = OpenMaya.MMatrix()
-            m_list = [aim_vn[0], aim_vn[1], aim_vn[2], 0, cross_vn[0],cross_vn[1],cross_vn[2],0, up_ortho_vn[0],up_ortho_vn[1],up_ortho_vn[2],0, mid_t[0], mid_t[1], mid_t[2], 1]
-            OpenMaya.MScriptUtil.createMatrixFromList(m_list, m)
-            tm = OpenMaya.MTransformationMatrix(m)
-            '''
-            
-            '''
-            rot_xyz = tm.rotation()
-
-            rx = (180/math.pi)*rot_xyz[0]
-            ry = (180/math.pi)*rot_xyz[1]
-            rz = (180/math.pi)*rot_xyz[2]
-            
-            out_x = mid_t.x
-            out_y = mid_t.y
-            out_z = mid_t.z
-            '''
-            #out_x = rx
-            #out_y = ry
-            #out_z = rz
+
+            # both ends aim along the cylinder, from the bottom to the top
+            aim_v = t_1 - t_2
+
+            top_m = aim_matrix(in_matrix_1_V, aim_v, t_1)
+            btm_m = aim_matrix(in_matrix_2_V, aim_v, t_2)
+
+            rotate_order = kRotateOrders[data_block.inputValue(petPneumatic.in_rotate_order).asShort()]
+            top_rot = OpenMaya.MTransformationMatrix(top_m).eulerRotation().reorder(rotate_order)
+            btm_rot = OpenMaya.MTransformationMatrix(btm_m).eulerRotation().reorder(rotate_order)
 
             #--------------------
             # OUTPUT
@@ -87,6 +171,85 @@ class petPneumatic(OpenMayaMPx.MPxNode):
             out_btm_pos_DH = data_block.outputValue(petPneumatic.out_btm_pos)
             out_btm_pos_DH.set3Float(t_2.x, t_2.y, t_2.z)
 
+            # the rotations are in radians, the unit of the angle children
+            out_top_rot_DH = data_block.outputValue(petPneumatic.out_top_rot)
+            out_top_rot_DH.set3Double(top_rot.x, top_rot.y, top_rot.z)
+
+            out_btm_rot_DH = data_block.outputValue(petPneumatic.out_btm_rot)
+            out_btm_rot_DH.set3Double(btm_rot.x, btm_rot.y, btm_rot.z)
+
+            out_top_matrix_DH = data_block.outputValue(petPneumatic.out_top_matrix)
+            out_top_matrix_DH.setMMatrix(top_m)
+
+            out_btm_matrix_DH = data_block.outputValue(petPneumatic.out_btm_matrix)
+            out_btm_matrix_DH.setMMatrix(btm_m)
+
+            # mark all the outputs clean, they are computed together
+            for out_DH in (out_top_pos_DH, out_btm_pos_DH, out_top_rot_DH, out_btm_rot_DH, out_top_matrix_DH, out_btm_matrix_DH):
+                out_DH.setClean()
+            data_block.setClean(plug)
+
+        elif plug == petPneumatic.out_cylinder:
+
+            #--------------------
+            # INPUT
+            #--------------------
+            # a cylinder for every index set on both matrix arrays
+            top_indices, top_rows = read_matrix_rows(data_block.inputArrayValue(petPneumatic.in_matrix_1_array))
+            btm_indices, btm_rows = read_matrix_rows(data_block.inputArrayValue(petPneumatic.in_matrix_2_array))
+
+            btm_lookup = dict((index, i) for i, index in enumerate(btm_indices))
+            pairs = [(index, i, btm_lookup[index]) for i, index in enumerate(top_indices) if index in btm_lookup]
+            indices = [index for index, _, _ in pairs]
+            top_rows = top_rows[[i for _, i, _ in pairs]]
+            btm_rows = btm_rows[[i for _, _, i in pairs]]
+
+            rotate_order = data_block.inputValue(petPneumatic.in_rotate_order).asShort()
+
+            #--------------------
+            # COMPUTE
+            #--------------------
+            # every cylinder in one pass, the same frames as aim_matrix
+            top_pos = top_rows[:, 3:]
+            btm_pos = btm_rows[:, 3:]
+            aim_v = top_pos - btm_pos
+
+            top_frames = aim_frames(aim_v, top_rows[:, :3])
+            btm_frames = aim_frames(aim_v, btm_rows[:, :3])
+            top_rot = euler_from_frames(top_frames, rotate_order)
+            btm_rot = euler_from_frames(btm_frames, rotate_order)
+
+            # the 16 values of every matrix, rows of the frame and the translation
+            n = len(indices)
+            top_m = np.zeros((n, 4, 4))
+            top_m[:, :3, :3] = top_frames
+            top_m[:, 3, :3] = top_pos
+            top_m[:, 3, 3] = 1.0
+            btm_m = top_m.copy()
+            btm_m[:, :3, :3] = btm_frames
+            btm_m[:, 3, :3] = btm_pos
+
+            #--------------------
+            # OUTPUT
+            #--------------------
+            # every cylinder through one builder
+            out_cylinder_AH = data_block.outputArrayValue(petPneumatic.out_cylinder)
+            builder = OpenMaya.MArrayDataBuilder(data_block, petPneumatic.out_cylinder, n)
+            values = zip(indices, top_pos.tolist(), btm_pos.tolist(), top_rot.tolist(), btm_rot.tolist(),
+                         top_m.reshape(n, 16).tolist(), btm_m.reshape(n, 16).tolist())
+            for index, t_pos, b_pos, t_rot, b_rot, t_m, b_m in values:
+                element_DH = builder.addElement(index)
+                element_DH.child(petPneumatic.out_cylinder_top_pos).set3Double(*t_pos)
+                element_DH.child(petPneumatic.out_cylinder_btm_pos).set3Double(*b_pos)
+                element_DH.child(petPneumatic.out_cylinder_top_rot).set3Double(*t_rot)
+                element_DH.child(petPneumatic.out_cylinder_btm_rot).set3Double(*b_rot)
+                for attr, m_list in ((petPneumatic.out_cylinder_top_matrix, t_m), (petPneumatic.out_cylinder_btm_matrix, b_m)):
+                    m = OpenMaya.MMatrix()
+                    OpenMaya.MScriptUtil.createMatrixFromList(m_list, m)
+                    element_DH.child(attr).setMMatrix(m)
+            out_cylinder_AH.set(builder)
+            out_cylinder_AH.setAllClean()
+
             # mark the plug clean
             data_block.setClean(plug)
 
@@ -106,6 +269,8 @@ def nodeInitializer():
     matrix_attr = OpenMaya.MFnMatrixAttribute()
 
     num_attr = OpenMaya.MFnNumericAttribute()
+    unit_attr = OpenMaya.MFnUnitAttribute()
+    enum_attr = OpenMaya.MFnEnumAttribute()
     k3_float = OpenMaya.MFnNumericData.k3Float
 
 
@@ -128,6 +293,15 @@ def nodeInitializer():
     matrix_attr.setStorable(True)
     matrix_attr.setKeyable(True)
 
+    # the rotation order of the output rotations, in the order of kRotateOrders
+    petPneumatic.in_rotate_order = enum_attr.create('rotateOrder', 'ro', 0)
+    for i, name in enumerate(['xyz', 'yzx', 'zxy', 'xzy', 'yxz', 'zyx']):
+        enum_attr.addField(name, i)
+    enum_attr.setReadable(True)
+    enum_attr.setWritable(True)
+    enum_attr.setStorable(True)
+    enum_attr.setKeyable(True)
+
     #--------------------
     # OUTPUT
     #--------------------
@@ -151,6 +325,93 @@ def nodeInitializer():
     num_attr.setStorable(False)
     num_attr.setKeyable(False)
 
+    # the rotations, angle compounds that can be connected straight to the rotate of a transform
+    for attr_name, short_name in (('topRot', 'tr'), ('btmRot', 'br')):
+        children = []
+        for axis in 'XYZ':
+            children.append(unit_attr.create(attr_name + axis, short_name + axis.lower(), OpenMaya.MFnUnitAttribute.kAngle, 0.0))
+            unit_attr.setWritable(False)
+            unit_attr.setStorable(False)
+        rot_attr = num_attr.create(attr_name, short_name, children[0], children[1], children[2])
+        num_attr.setReadable(True)
+        num_attr.setWritable(False)
+        num_attr.setStorable(False)
+        num_attr.setKeyable(False)
+        if short_name == 'tr':
+            petPneumatic.out_top_rot = rot_attr
+        else:
+            petPneumatic.out_btm_rot = rot_attr
+
+    # the matrices, y aims along the cylinder and x follows the x axis of each input matrix
+    petPneumatic.out_top_matrix = matrix_attr.create('topMatrix', 'tm')
+    matrix_attr.setReadable(True)
+    matrix_attr.setWritable(False)
+    matrix_attr.setStorable(False)
+
+    petPneumatic.out_btm_matrix = matrix_attr.create('btmMatrix', 'bm')
+    matrix_attr.setReadable(True)
+    matrix_attr.setWritable(False)
+    matrix_attr.setStorable(False)
+
+    #--------------------
+    # ARRAY MODE
+    #--------------------
+    # many cylinders in one node, element i of the two matrix arrays are the top and bottom of cylinder i
+    petPneumatic.in_matrix_1_array = matrix_attr.create('in_matrix_1_array', 'im1a')
+    matrix_attr.setArray(True)
+    matrix_attr.setReadable(True)
+    matrix_attr.setWritable(True)
+    matrix_attr.setStorable(True)
+
+    petPneumatic.in_matrix_2_array = matrix_attr.create('in_matrix_2_array', 'im2a')
+    matrix_attr.setArray(True)
+    matrix_attr.setReadable(True)
+    matrix_attr.setWritable(True)
+    matrix_attr.setStorable(True)
+
+    # the outputs of every cylinder, the same as the single cylinder outputs
+    k3_double = OpenMaya.MFnNumericData.k3Double
+    petPneumatic.out_cylinder_top_pos = num_attr.create('outTopPos', 'otp', k3_double)
+    num_attr.setWritable(False)
+    num_attr.setStorable(False)
+
+    petPneumatic.out_cylinder_btm_pos = num_attr.create('outBtmPos', 'obp', k3_double)
+    num_attr.setWritable(False)
+    num_attr.setStorable(False)
+
+    for attr_name, short_name in (('outTopRot', 'otr'), ('outBtmRot', 'obr')):
+        children = []
+        for axis in 'XYZ':
+            children.append(unit_attr.create(attr_name + axis, short_name + axis.lower(), OpenMaya.MFnUnitAttribute.kAngle, 0.0))
+            unit_attr.setWritable(False)
+            unit_attr.setStorable(False)
+        rot_attr = num_attr.create(attr_name, short_name, children[0], children[1], children[2])
+        num_attr.setWritable(False)
+        num_attr.setStorable(False)
+        if short_name == 'otr':
+            petPneumatic.out_cylinder_top_rot = rot_attr
+        else:
+            petPneumatic.out_cylinder_btm_rot = rot_attr
+
+    petPneumatic.out_cylinder_top_matrix = matrix_attr.create('outTopMatrix', 'otm')
+    matrix_attr.setWritable(False)
+    matrix_attr.setStorable(False)
+
+    petPneumatic.out_cylinder_btm_matrix = matrix_attr.create('outBtmMatrix', 'obm')
+    matrix_attr.setWritable(False)
+    matrix_attr.setStorable(False)
+
+    compound_attr = OpenMaya.MFnCompoundAttribute()
+    petPneumatic.out_cylinder = compound_attr.create('outCylinder', 'ocy')
+    for child in (petPneumatic.out_cylinder_top_pos, petPneumatic.out_cylinder_btm_pos,
+                  petPneumatic.out_cylinder_top_rot, petPneumatic.out_cylinder_btm_rot,
+                  petPneumatic.out_cylinder_top_matrix, petPneumatic.out_cylinder_btm_matrix):
+        compound_attr.addChild(child)
+    compound_attr.setArray(True)
+    compound_attr.setUsesArrayDataBuilder(True)
+    compound_attr.setWritable(False)
+    compound_attr.setStorable(False)
+
 
     #--------------------
     # ADD ATTR TO NODE
@@ -159,6 +420,14 @@ def nodeInitializer():
     petPneumatic.addAttribute(petPneumatic.in_matrix_2)
     petPneumatic.addAttribute(petPneumatic.out_top_pos)
     petPneumatic.addAttribute(petPneumatic.out_btm_pos)
+    petPneumatic.addAttribute(petPneumatic.in_rotate_order)
+    petPneumatic.addAttribute(petPneumatic.out_top_rot)
+    petPneumatic.addAttribute(petPneumatic.out_btm_rot)
+    petPneumatic.addAttribute(petPneumatic.out_top_matrix)
+    petPneumatic.addAttribute(petPneumatic.out_btm_matrix)
+    petPneumatic.addAttribute(petPneumatic.in_matrix_1_array)
+    petPneumatic.addAttribute(petPneumatic.in_matrix_2_array)
+    petPneumatic.addAttribute(petPneumatic.out_cylinder)
 
     #--------------------
     # SETUP DEPENDENCY
@@ -169,6 +438,16 @@ def nodeInitializer():
     petPneumatic.attributeAffects(petPneumatic.in_matrix_1, petPneumatic.out_btm_pos)
     petPneumatic.attributeAffects(petPneumatic.in_matrix_2, petPneumatic.out_btm_pos)
 
+    for out_attr in (petPneumatic.out_top_rot, petPneumatic.out_btm_rot, petPneumatic.out_top_matrix, petPneumatic.out_btm_matrix):
+        petPneumatic.attributeAffects(petPneumatic.in_matrix_1, out_attr)
+        petPneumatic.attributeAffects(petPneumatic.in_matrix_2, out_attr)
+    petPneumatic.attributeAffects(petPneumatic.in_rotate_order, petPneumatic.out_top_rot)
+    petPneumatic.attributeAffects(petPneumatic.in_rotate_order, petPneumatic.out_btm_rot)
+
+    petPneumatic.attributeAffects(petPneumatic.in_matrix_1_array, petPneumatic.out_cylinder)
+    petPneumatic.attributeAffects(petPneumatic.in_matrix_2_array, petPneumatic.out_cylinder)
+    petPneumatic.attributeAffects(petPneumatic.in_rotate_order, petPneumatic.out_cylinder)
+
 def initializePlugin(mobject):
     mplugin = OpenMayaMPx.MFnPlugin(mobject)
     try:
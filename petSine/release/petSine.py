@@ -1,4 +1,5 @@
 import sys, math    
+import numpy as np
 from maya import OpenMaya, OpenMayaMPx
 
 # The name of the node.
@@ -19,6 +20,12 @@ class petSine(OpenMayaMPx.MPxNode):
     in_radius = OpenMaya.MObject()
     out_result = OpenMaya.MObject()
 
+    # array mode, the wave sampled at phase shifted positions along a chain
+    in_sample_count = OpenMaya.MObject()
+    in_phase_step = OpenMaya.MObject()
+    in_falloff = OpenMaya.MObject()
+    out_results = OpenMaya.MObject()
+
     def __init__(self):
         OpenMayaMPx.MPxNode.__init__(self)
 
@@ -59,6 +66,49 @@ class petSine(OpenMayaMPx.MPxNode):
             # mark the plug clean
             data_block.setClean(plug)
 
+        elif plug == petSine.out_results or (plug.isElement() and plug.array() == petSine.out_results):
+
+            #--------------------
+            # INPUT
+            #--------------------
+            in_angle_value = data_block.inputValue(petSine.in_angle).asFloat()
+            in_angle_offset_value = data_block.inputValue(petSine.in_angle_offset).asFloat()
+            in_angle_scale_value = data_block.inputValue(petSine.in_angle_scale).asFloat()
+            in_radius_value = data_block.inputValue(petSine.in_radius).asFloat()
+
+            in_sample_count_value = max(data_block.inputValue(petSine.in_sample_count).asInt(), 0)
+            in_phase_step_value = data_block.inputValue(petSine.in_phase_step).asFloat()
+            in_falloff_value = data_block.inputValue(petSine.in_falloff).asFloat()
+
+            #--------------------
+            # COMPUTE
+            #--------------------
+            # sample i is the wave with i phase steps added to the angle, all samples in one evaluation
+            samples = np.arange(in_sample_count_value, dtype=np.float64)
+            angles = in_angle_value + in_angle_offset_value + samples*in_phase_step_value
+
+            # the amplitude falls off linearly from radius at the first sample to radius*(1-falloff) at the last
+            if in_sample_count_value > 1:
+                amplitude = in_radius_value * (1.0 - in_falloff_value * samples/(in_sample_count_value - 1))
+            else:
+                amplitude = in_radius_value
+
+            out_results_value = np.sin(angles*in_angle_scale_value)*amplitude
+
+            #--------------------
+            # OUTPUT
+            #--------------------
+            # write every sample through one builder
+            out_results_arrayhandle = data_block.outputArrayValue(petSine.out_results)
+            builder = OpenMaya.MArrayDataBuilder(data_block, petSine.out_results, in_sample_count_value)
+            for i, value in enumerate(out_results_value.tolist()):
+                builder.addElement(i).setFloat(value)
+            out_results_arrayhandle.set(builder)
+            out_results_arrayhandle.setAllClean()
+
+            # mark the plug clean
+            data_block.setClean(plug)
+
         # optionally we could return unknown here, sine we expect only one output 
         # plug specified to be passed to the compute method
         else:
@@ -110,6 +160,28 @@ def nodeInitializer():
     mfn_attr.setStorable(1)
     mfn_attr.setKeyable(1)
 
+    # the number of samples of the results array
+    petSine.in_sample_count = mfn_attr.create('sampleCount', 'sc', OpenMaya.MFnNumericData.kInt, 0)
+    mfn_attr.setMin(0)
+    mfn_attr.setReadable(1)
+    mfn_attr.setWritable(1)
+    mfn_attr.setStorable(1)
+    mfn_attr.setKeyable(1)
+
+    # the angle added per sample
+    petSine.in_phase_step = mfn_attr.create('phaseStep', 'ps', kFloat, 0.5)
+    mfn_attr.setReadable(1)
+    mfn_attr.setWritable(1)
+    mfn_attr.setStorable(1)
+    mfn_attr.setKeyable(1)
+
+    # how much of the radius is lost at the last sample, 0 keeps the full radius on all samples
+    petSine.in_falloff = mfn_attr.create('falloff', 'fo', kFloat, 0.0)
+    mfn_attr.setReadable(1)
+    mfn_attr.setWritable(1)
+    mfn_attr.setStorable(1)
+    mfn_attr.setKeyable(1)
+
 
     #--------------------
     # OUTPUT
@@ -124,6 +196,15 @@ def nodeInitializer():
     mfn_attr.setStorable(0)
     mfn_attr.setKeyable(0)
 
+    # the wave at every sample
+    petSine.out_results = mfn_attr.create('results', 'rs', kFloat)
+    mfn_attr.setArray(1)
+    mfn_attr.setUsesArrayDataBuilder(1)
+    mfn_attr.setReadable(1)
+    mfn_attr.setWritable(0)
+    mfn_attr.setStorable(0)
+    mfn_attr.setKeyable(0)
+
 
     #--------------------
     # ADD ATTR TO NODE
@@ -133,6 +214,10 @@ def nodeInitializer():
     petSine.addAttribute(petSine.in_angle_scale)
     petSine.addAttribute(petSine.in_radius)
     petSine.addAttribute(petSine.out_result)
+    petSine.addAttribute(petSine.in_sample_count)
+    petSine.addAttribute(petSine.in_phase_step)
+    petSine.addAttribute(petSine.in_falloff)
+    petSine.addAttribute(petSine.out_results)
 
     #--------------------
     # SETUP DEPENDENCY
@@ -143,6 +228,14 @@ def nodeInitializer():
     petSine.attributeAffects(petSine.in_angle_scale, petSine.out_result)
     petSine.attributeAffects(petSine.in_radius, petSine.out_result)
 
+    petSine.attributeAffects(petSine.in_angle, petSine.out_results)
+    petSine.attributeAffects(petSine.in_angle_offset, petSine.out_results)
+    petSine.attributeAffects(petSine.in_angle_scale, petSine.out_results)
+    petSine.attributeAffects(petSine.in_radius, petSine.out_results)
+    petSine.attributeAffects(petSine.in_sample_count, petSine.out_results)
+    petSine.attributeAffects(petSine.in_phase_step, petSine.out_results)
+    petSine.attributeAffects(petSine.in_falloff, petSine.out_results)
+
 def initializePlugin(mobject):
     mplugin = OpenMayaMPx.MFnPlugin(mobject)
     try: